@@ -0,0 +1,192 @@
+# Benchmarks of the hot paths of the preprocessing and the dashboards on synthetic events.
+# The results are written as json with the runtime and the peak memory of every benchmark and are compared with
+# a stored baseline when one exists. No baseline is committed because the runtimes depend on the machine,
+# the first run on a machine stores one with --save-baseline.
+#
+# Usage (from the root of the repository):
+#   python -m benchmarks.run_benchmarks --sizes 2000 50000 264395
+#   python -m benchmarks.run_benchmarks --save-baseline     # store the results as new baseline
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import pandas as pd
+
+from benchmarks.synthetic_data import write_events_json, add_synthetic_stimmung
+from utils.data_extraction import extract_json_data_into_dataframe
+from utils.data_preprocessing import (remove_events_not_in_stuttgart, remove_event_data_prefix, add_district, extract_categories,
+                                      compact_event_table)
+from utils.feature_engineering import add_time_features
+from utils.filter_index import build_filter_index, build_value_lookup
+from utils.html_table import render_html_table
+from utils.venue_profiles import build_venue_facet_counts
+from utils.word_frequencies import compute_token_counts, get_word_frequencies, render_word_cloud
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, 'results', 'latest.json')
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+
+def measure(function, repeat: int = 3) -> dict:
+    """
+    Time a function and measure its peak memory. The peak memory is measured in a separate run because
+    tracemalloc slows down the function.
+    :param function: function without arguments
+    :param repeat: number of timed runs
+    :return: dictionary with the minimal and median runtime in seconds and the peak memory in bytes
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'min_seconds': min(timings), 'median_seconds': statistics.median(timings), 'peak_memory_bytes': peak_memory}
+
+
+def get_benchmarks(json_file_path: str) -> list:
+    """
+    Prepare the inputs of the benchmarks, the preparation itself is not timed
+    :param json_file_path: path to the synthetic json file
+    :return: list of (name, function) of the benchmarks in the order of the preprocessing and the dashboard
+    """
+    import dashboard_all_events as dashboard
+    from streamlit import config as streamlit_config, logger as streamlit_logger
+    # streamlit warns about every widget that is created outside of "streamlit run"
+    streamlit_config.set_option('global.showWarningOnDirectExecution', False)
+    streamlit_logger.set_log_level('error')
+
+    raw_df = extract_json_data_into_dataframe(json_file_path)
+    stuttgart_df = remove_event_data_prefix(remove_events_not_in_stuttgart(raw_df))
+    time_df = add_time_features(stuttgart_df)
+    # all events are kept instead of only Wednesdays, so the dashboard data has about the requested size
+    events_df = add_synthetic_stimmung(extract_categories(add_district(time_df))).reset_index(drop=True)
+    # the dashboards keep the compact table of the dashboard columns in memory
+    dashboard_df = compact_event_table(events_df[dashboard.DASHBOARD_COLUMNS])
+    venue_facet_counts = build_venue_facet_counts(dashboard_df)
+    venue_facet_index = build_filter_index(venue_facet_counts)
+    subcategory_lookup = build_value_lookup(dashboard_df, 'supercategory', 'subcategory')
+    # the worst case of the sidebar: everything is selected
+    selections = {
+        'event_type': dashboard_df['supercategory'].unique().tolist(),
+        'location_sidebar': dashboard_df['district'].unique().tolist(),
+        'season': dashboard_df['season'].unique().tolist(),
+        'event_subtype': dashboard_df['subcategory'].unique().tolist(),
+        'mood': dashboard_df['stimmung'].unique().tolist(),
+    }
+
+    def render_word_cloud_of_descriptions():
+        render_word_cloud(get_word_frequencies(compute_token_counts(events_df['description'])))
+
+    return [
+        ('extract_json_data_into_dataframe', lambda: extract_json_data_into_dataframe(json_file_path)),
+        ('remove_events_not_in_stuttgart', lambda: remove_events_not_in_stuttgart(raw_df)),
+        ('add_time_features', lambda: add_time_features(stuttgart_df)),
+        ('add_district', lambda: add_district(time_df)),
+        ('extract_categories', lambda: extract_categories(time_df)),
+        ('build_filter_index', lambda: build_filter_index(dashboard_df)),
+        ('build_venue_facet_counts', lambda: build_venue_facet_counts(dashboard_df)),
+        ('prepare_sub_df_for_output_top5', lambda: dashboard.prepare_sub_df_for_output(venue_facet_counts, venue_facet_index, True, **selections)),
+        ('prepare_sub_df_for_output_all', lambda: dashboard.prepare_sub_df_for_output(venue_facet_counts, venue_facet_index, False, **selections)),
+        ('render_location_page', lambda: render_html_table(dashboard.prepare_sub_df_for_output(venue_facet_counts, venue_facet_index, False, page=2, **selections))),
+        ('display_subcategories', lambda: dashboard.display_subcategories(selections['event_type'], subcategory_lookup)),
+        ('word_cloud', render_word_cloud_of_descriptions),
+    ]
+
+
+def run_benchmarks(sizes: list, repeat: int = 3, data_dir: str = None, only: list = None) -> dict:
+    """
+    :param sizes: numbers of synthetic events
+    :param repeat: number of timed runs of every benchmark
+    :param data_dir: directory of the synthetic json files, they are reused by later runs
+    :param only: names of the benchmarks that are run, None to run all benchmarks
+    :return: dictionary with information about the environment and the results of every size
+    """
+    data_dir = data_dir or os.path.join(BENCHMARK_DIR, 'data')
+    results = {}
+    for size in sizes:
+        json_file_path = write_events_json(os.path.join(data_dir, f'synthetic_events_{size}.json'), size)
+        results[str(size)] = {}
+        for name, function in get_benchmarks(json_file_path):
+            if only and name not in only:
+                continue
+            # the dashboard functions print and write streamlit widgets, neither is part of the measurement
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[str(size)][name] = measure(function, repeat)
+            print(f'{size:>8} {name:<40} {results[str(size)][name]["min_seconds"]:10.4f}s '
+                  f'{results[str(size)][name]["peak_memory_bytes"] / 2 ** 20:10.1f} MiB')
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare_with_baseline(report: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """
+    Compare the minimal runtime and the peak memory with the baseline
+    :param report: results of run_benchmarks
+    :param baseline: results of an earlier run
+    :param tolerance: relative increase that is still accepted, e.g. 0.2 for 20%
+    :return: list of the regressions as (size, name, metric, baseline value, value)
+    """
+    regressions = []
+    for size, benchmarks in report['results'].items():
+        for name, result in benchmarks.items():
+            baseline_result = baseline.get('results', {}).get(size, {}).get(name)
+            if baseline_result is None:
+                continue
+            for metric in ['min_seconds', 'peak_memory_bytes']:
+                ratio = result[metric] / baseline_result[metric] if baseline_result[metric] else 1
+                print(f'{size:>8} {name:<40} {metric:<18} {ratio:6.2f}x')
+                if ratio > 1 + tolerance:
+                    regressions.append((size, name, metric, baseline_result[metric], result[metric]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths on synthetic events')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2000], help='numbers of synthetic events, e.g. 2000 50000 264395')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs of every benchmark')
+    parser.add_argument('--only', nargs='+', default=None, help='only run these benchmarks')
+    parser.add_argument('--data-dir', default=None, help='directory of the synthetic json files')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='json file the results are written to')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='results the run is compared with')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative slowdown that is not reported as regression')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.repeat, args.data_dir, args.only)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(report, json.load(f), args.tolerance)
+        for size, name, metric, baseline_value, value in regressions:
+            print(f'Regression: {name} with {size} events, {metric} {baseline_value:.4g} -> {value:.4g}')
+        if regressions:
+            sys.exit(1)
+    else:
+        print(f'No baseline to compare with, store one with --save-baseline (written to {args.baseline})')
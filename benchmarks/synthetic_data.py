@@ -0,0 +1,97 @@
+# Synthetic events that are shaped like the events of stuttgart_events.json, so the benchmarks do not need the
+# real dump. The values are drawn from the categories, districts and flairs that the dashboards know about.
+
+import json
+import os
+import random
+
+from utils.data_preprocessing import zip_code_to_district
+from utils.topic_model import TOPIC_LABELS_MAPPING
+
+CATEGORIES = ['Restaurant/Italian Restaurant', 'Restaurant/German Restaurant', 'Kultur/Theater', 'Kultur/Kino', 'Party',
+              'Performance & Event Venue', 'Dance & Night Club/Techno', 'Bar/Cocktail Bar', 'Bar/Beer Garden',
+              'Church', 'University', 'Club/Jazz Club', 'Arts/Gallery', 'Museum/Art Museum', 'Library', 'Sports/Gym',
+              'Education', 'Local Business', None]
+CITIES = ['Stuttgart'] * 9 + ['Esslingen am Neckar', 'Ludwigsburg', 'Böblingen']
+WORDS = ['live', 'musik', 'konzert', 'party', 'dj', 'abend', 'eintritt', 'frei', 'kunst', 'ausstellung', 'vortrag',
+         'kultur', 'yoga', 'lauf', 'training', 'theater', 'kinder', 'familie', 'essen', 'trinken', 'wein', 'bier',
+         'führung', 'stadt', 'geschichte', 'jazz', 'band', 'tanz', 'workshop', 'music', 'night', 'festival',
+         'lesung', 'buch', 'film', 'kino', 'markt', 'sommer', 'winter', 'herbst', 'frühling', 'stuttgart', 'uhr']
+
+
+def generate_event(event_id: int, rng: random.Random, num_locations: int) -> dict:
+    """
+    :param event_id: id of the event
+    :param rng: random number generator, the events only depend on its seed
+    :param num_locations: number of different locations the events take place at
+    :return: event with the nested structure of the events in stuttgart_events.json
+    """
+    location_id = rng.randrange(num_locations)
+    # every location always has the same category, address and city
+    location_rng = random.Random(location_id)
+    postal_codes = list(zip_code_to_district) + ['70000', '70563', '70619']
+    description = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 60)))
+    if rng.random() < 0.3:
+        description = f'<p>{description}</p><br> https://www.example-{location_id}.de'
+    return {
+        'id': str(event_id),
+        'eventData': {
+            'name': f'Event {event_id}',
+            'description': description if rng.random() > 0.05 else None,
+            'startDate': f'20{rng.randint(20, 23)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:{rng.choice(["00", "30"])}:00+01:00',
+            'cancelled': rng.random() < 0.05,
+            'location': {
+                'name': f'Location {location_id}',
+                'category': location_rng.choice(CATEGORIES),
+                'location': {
+                    'address': {
+                        'city': location_rng.choice(CITIES),
+                        'postalCode': location_rng.choice(postal_codes),
+                        'street': f'Königstraße {location_id % 200 + 1}',
+                    },
+                    'coordinate': {'lat': 48.7 + location_rng.random() * 0.1, 'lon': 9.1 + location_rng.random() * 0.15},
+                },
+            },
+        },
+    }
+
+
+def write_events_json(path: str, num_events: int, seed: int = 42) -> str:
+    """
+    Write synthetic events into a json file with a top level array like stuttgart_events.json.
+    The file is only written if it does not exist yet.
+    :param path: path of the json file
+    :param num_events: number of events
+    :param seed: seed of the random number generator
+    :return: path of the json file
+    """
+    if os.path.exists(path):
+        return path
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    num_locations = max(50, num_events // 20)
+    # the events are written one by one, so large files do not have to fit into memory
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write('[')
+        for event_id in range(num_events):
+            if event_id:
+                f.write(',\n')
+            json.dump(generate_event(event_id, rng, num_locations), f, ensure_ascii=False)
+        f.write(']\n')
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def add_synthetic_stimmung(df, seed: int = 42):
+    """
+    Assign a random stimmung to every event instead of fitting the topic model
+    :param df: dataframe containing the preprocessed events
+    :param seed: seed of the random number generator
+    :return: dataframe with the column stimmung
+    """
+    rng = random.Random(seed)
+    df = df.copy()
+    df['stimmung'] = [rng.choice(list(TOPIC_LABELS_MAPPING.values())) for _ in range(len(df))]
+    return df
@@ -1,14 +1,31 @@
 # File to build dashboard using streamlite
 
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
-from wordcloud import WordCloud
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-import matplotlib.pyplot as plt
 import plotly.express as px
-import statistics
+from utils.data_preprocessing import get_event_store_columns, resolve_event_store_path
+from utils.dataset_loader import load_dataset, get_dataset_info, get_dataset_artifact
+from utils.filter_index import build_filter_index, build_value_lookup, get_facet_values
+from utils.google_maps import create_google_maps_links
+from utils.html_table import render_html_table
+from utils.instrumentation import span, timed, start_rerun, get_spans, get_breakdown, finish_rerun, is_enabled
+from utils.query_engine import select_event_rows, find_locations, count_locations, load_venue_facet_counts
+from utils.query_service import fetch_locations, fetch_location_count
+from utils.result_cache import ResultCache, normalize_preferences
+from utils.spatial_index import build_spatial_index, cluster_points
+from utils.summary_cube import build_summary_cube, count_values, get_unique_values
+from utils.word_frequencies import load_word_cloud_png
+
+# Columns of the event store that are used by the dashboard, only these are loaded.
+# The word cloud of the descriptions is computed offline, see utils/word_frequencies
+DASHBOARD_COLUMNS = ['location.name', 'location.location.address.street', 'supercategory', 'subcategory', 'stimmung', 'season', 'district', 'month', 'starting_hour', 'time_of_day', 'location.location.coordinate.lat', 'location.location.coordinate.lon']
+DATASET = 'all_events_dashboard'
+# url of the query service (python -m utils.query_service), the locations are computed in this process if not set
+QUERY_SERVICE_URL = os.environ.get('QUERY_SERVICE_URL')
+# number of locations per page of the all locations table
+PAGE_SIZE = 50
 
 def display_title():
     # Create a title for the dashboard
@@ -22,7 +39,7 @@ def display_title():
 # - The type of event (concert, party, singer in a bar, ...)
 # - The location (größeren Viertel von Stuttgart zur Auswahl stellen (durch ZIP Code) )
 
-def get_user_preferences():
+def get_user_preferences(moods: list):
     st.sidebar.title("Dashboard Controls")
     # Create a multiselect widget for the location
     location_sidebar = st.sidebar.multiselect(
@@ -38,11 +55,11 @@ def get_user_preferences():
         ['spring', 'summer', 'autumn', 'winter']
     )
 
-    # Create a multiselect widget for the mood
+    # Create a multiselect widget for the mood, the options are the stimmung labels of the event store
     mood = st.sidebar.multiselect(
         'What should be the flair of the event?',
-        ['Musikalisch', 'Informativ', 'Entspannt', 'Feierlich', 'Energiegeladen'],
-        ['Musikalisch', 'Informativ', 'Entspannt', 'Feierlich', 'Energiegeladen']
+        moods,
+        moods
     )
 
     # Create a multiselect widget for the type of event
@@ -55,13 +72,12 @@ def get_user_preferences():
     return event_type, location_sidebar, season, mood
 
 
-def display_subcategories(event_types: list, df: pd.DataFrame, default_value='No Subcategory'):
+@timed()
+def display_subcategories(event_types: list, subcategory_lookup: dict, default_value='No Subcategory'):
     subcategories = []
     for event_type in event_types:
-        subcategory = df[df['supercategory'] == event_type]['subcategory'].unique()
-        # remove nan from subcategories
-        subcategory = subcategory[~pd.isnull(subcategory)]
-        subcategories.extend(subcategory)
+        # the subcategories of each supercategory are precomputed when the dataset is loaded
+        subcategories.extend(subcategory_lookup.get(event_type, ()))
     # If there are no subcategories, use the default value
     if not subcategories:
         subcategories = [default_value]
@@ -75,85 +91,65 @@ def display_subcategories(event_types: list, df: pd.DataFrame, default_value='No
     return event_subtype
 
 
-def create_link_to_GoogleMaps(row):
-    google_maps_address = f"https://www.google.com/maps/search/?api=1&query={row['Location']},{row['Address']}, Stuttgart"
-    return f'<a href="{google_maps_address}" target="_blank">Find {row["Location"]} on Maps</a>'
-
-def prepare_sub_df_for_output(df: pd.DataFrame, top5: bool, event_type: list, location_sidebar: list, season: list, event_subtype: list, mood: list):
+@timed()
+def prepare_sub_df_for_output(venue_facet_counts: pd.DataFrame, venue_facet_index: dict, top5: bool, event_type: list, location_sidebar: list, season: list, event_subtype: list, mood: list, page: int = None):
     """ Select the data from the dataframe that corresponds to the user preferences and return a dataframe with the relevant data
     
-    :param df: the dataframe with all the events
+    :param venue_facet_counts: the number of events per venue and facet combination, see utils/venue_profiles
+    :param venue_facet_index: the filter index of venue_facet_counts created by build_filter_index
     :param top5: boolean to indicate if only the top 5 locations should be returned
     :param event_type: list of event types
     :param location_sidebar: list of district names that the user selected
     :param season: list of seasons that the user selected
     :param event_subtype: list of event subtypes that the user selected
     :param mood: list of moods that the user selected
+    :param page: page of the all locations table with PAGE_SIZE locations, starting at 1. None for all locations
     """
-    sub_df = df[df['season'].isin(season) & df['district'].isin(location_sidebar) & df['supercategory'].isin(event_type) & (df['subcategory'].isin(event_subtype) | (df['subcategory'] == "")) & df['stimmung'].isin(mood)]
-    # Only select the relevant columns
-    sub_df = sub_df[['name', 'description', 'location.name', 'location.location.address.street', 'supercategory', 'subcategory', 'stimmung']]
-    sub_df.columns = ['Event', 'Description', 'Location', 'Address', 'Type', 'Category', 'Flair']
-    # create a dictionary with the location as key and the address and category as values
-    location_dict = {}
-    for index, row in sub_df.iterrows():
-        if row['Location'] not in location_dict:
-            location_dict[row['Location']] = [row['Address'], [row['Type']], [row['Category']], [row['Flair']], 1]
-        else:
-            location_dict[row['Location']][3].append(row['Flair'])
-            location_dict[row['Location']][2].append(row['Category'])
-            location_dict[row['Location']][1].append(row['Type'])
-            location_dict[row['Location']][4] += 1
-
-    # After creating the dictionary, find the most common flair, type and category for each location. This will be displayed in the dashboard
-    for location in location_dict:
-        location_dict[location][3] = statistics.mode(location_dict[location][3])
-        location_dict[location][2] = statistics.mode(location_dict[location][2])
-        location_dict[location][1] = statistics.mode(location_dict[location][1])
-    # count number of events per location
-    events_per_location_count_df = sub_df.groupby(['Location']).count()
-    # sort by number of events per location
-    events_per_location_count_df = events_per_location_count_df.sort_values(by=['Event'], ascending=False)
-    # calculate average number of events per location
-    if top5 == True:
-        # get the top 5 location names
-        top_5_locations = events_per_location_count_df.head(5).index.tolist()
-        # create a new dataframe with only the top 5 locations using the location_dict
-        top_5_locations_df = pd.DataFrame(columns=['Location', 'Address', 'Type', 'Category', 'Flair', 'Popularity'])
-        for location in top_5_locations:
-            star_rating = min(location_dict[location][4], 5)
-            num_of_events = location_dict[location][4]
-            new_entry = pd.DataFrame([[location, location_dict[location][0], location_dict[location][1], location_dict[location][2], location_dict[location][3], star_rating*'⭐', num_of_events]], columns=['Location', 'Address', 'Type', 'Category', 'Flair', 'Popularity', 'Number of Events'])
-            top_5_locations_df = pd.concat([top_5_locations_df, new_entry])
-        top_5_locations = top_5_locations_df.reset_index(drop=True)
-        top_5_locations['Google Maps Link 📍🗺️'] = top_5_locations.apply(create_link_to_GoogleMaps, axis=1)
-        return top_5_locations
+    # For the top 5 locations only the 5 locations with the most events are returned
+    top_n, offset = (5, 0) if top5 else (None, 0) if page is None else (PAGE_SIZE, (page - 1) * PAGE_SIZE)
+    if QUERY_SERVICE_URL:
+        with span('query_service'):
+            locations_df = fetch_locations(QUERY_SERVICE_URL, DATASET, event_type, location_sidebar, season, event_subtype, mood, top_n=top_n, offset=offset)
     else:
-        # get all location names
-        all_locations = events_per_location_count_df.index.tolist()
-        # create new df with all locations using the location_dict
-        all_locations_df = pd.DataFrame(columns=['Location', 'Address', 'Type', 'Category', 'Flair', 'Popularity'])
-        for location in all_locations:
-            star_rating = min(location_dict[location][4], 5)
-            num_of_events = location_dict[location][4]
-            new_entry = pd.DataFrame([[location, location_dict[location][0], location_dict[location][1], location_dict[location][2], location_dict[location][3], star_rating*'⭐', num_of_events]], columns=['Location', 'Address', 'Type', 'Category', 'Flair', 'Popularity', 'Number of Events'])
-            all_locations_df = pd.concat([all_locations_df, new_entry])
-        all_locations = all_locations_df.reset_index(drop=True)
-        all_locations['Google Maps Link 📍🗺️'] = all_locations.apply(create_link_to_GoogleMaps, axis=1)
-        return all_locations
-
-
-def display_locations(df: pd.DataFrame, selected_tab: str, event_type, location_sidebar, season, event_subtype, mood):
+        locations_df = find_locations(venue_facet_counts, venue_facet_index, event_type, location_sidebar, season, event_subtype, mood, top_n=top_n, offset=offset)
+    with span('google_maps_links'):
+        locations_df['Google Maps Link 📍🗺️'] = create_google_maps_links(locations_df['Location'], locations_df['Address'])
+    return locations_df
+
+
+def count_locations_for_output(venue_facet_counts: pd.DataFrame, venue_facet_index: dict, event_type: list, location_sidebar: list, season: list, event_subtype: list, mood: list) -> int:
+    # number of rows of the all locations table, see prepare_sub_df_for_output for the parameters
+    if QUERY_SERVICE_URL:
+        with span('query_service'):
+            return fetch_location_count(QUERY_SERVICE_URL, DATASET, event_type, location_sidebar, season, event_subtype, mood)
+    return count_locations(venue_facet_counts, venue_facet_index, event_type, location_sidebar, season, event_subtype, mood)
+
+
+@timed()
+def display_locations(venue_facet_counts: pd.DataFrame, venue_facet_index: dict, result_cache: ResultCache, selected_tab: str, event_type, location_sidebar, season, event_subtype, mood):
+    # the rendered table is cached per selection, so popular selections are only computed once
+    cache_key = normalize_preferences(selected_tab, event_type, location_sidebar, season, event_subtype, mood)
+
+    def render(top5: bool, page: int = None) -> str:
+        locations_df = prepare_sub_df_for_output(venue_facet_counts, venue_facet_index, top5=top5, event_type=event_type, location_sidebar=location_sidebar, season=season, event_subtype=event_subtype, mood=mood, page=page)
+        with span('to_html'):
+            return render_html_table(locations_df)
+
     if selected_tab == "Top 5 Locations":
         st.subheader('Top 5 Locations for your preferences🚀')
-        output_df = prepare_sub_df_for_output(df, top5=True, event_type=event_type, location_sidebar=location_sidebar, season=season, event_subtype=event_subtype, mood=mood)
-        st.write(output_df.to_html(escape=False, index=False, justify='center'), unsafe_allow_html=True)
+        output_html = result_cache.get_or_render(cache_key, lambda: render(top5=True))
+        st.write(output_html, unsafe_allow_html=True)
 
     elif selected_tab == "All Locations":
         st.subheader('All locations that correspond to your preferences')
-        output_df = prepare_sub_df_for_output(df, top5=False, event_type=event_type, location_sidebar=location_sidebar, season=season, event_subtype=event_subtype, mood=mood)
-        st.write(output_df.to_html(escape=False, index=False, justify='center'), unsafe_allow_html=True)
-
+        # only the locations of one page are aggregated and sent to the browser, however many locations match
+        num_locations = count_locations_for_output(venue_facet_counts, venue_facet_index, event_type, location_sidebar, season, event_subtype, mood)
+        num_pages = max(1, (num_locations + PAGE_SIZE - 1) // PAGE_SIZE)
+        page = st.number_input(f'Page (of {num_pages}, {num_locations} locations)', min_value=1, max_value=num_pages, value=1, step=1)
+        output_html = result_cache.get_or_render(cache_key + (page,), lambda: render(top5=False, page=page))
+        st.write(output_html, unsafe_allow_html=True)
+
+@timed()
 def show_no_of_events_used(df: pd.DataFrame):
     st.markdown('&nbsp;')
     num_events = len(df)
@@ -197,10 +193,8 @@ def show_google_maps_stuttgart():
     # Display the Google Maps iframe in Streamlit
     st.markdown(google_maps_iframe, unsafe_allow_html=True)
 
-def display_colnames(df: pd.DataFrame):
+def display_colnames(column_names: list):
     st.markdown('&nbsp;')
-    # Assuming df is your DataFrame
-    df = df
     # List of columns created by feature engineering
     feature_engineering_cols = ['dayofweek', 'year', 'month', 'season', 'district', 'supercategory', 'subcategory', 'starting_hour', 'time_of_day']
     # Display a title
@@ -209,7 +203,7 @@ def display_colnames(df: pd.DataFrame):
     st.markdown('<div style="border: 2px solid #ddd; padding: 10px; border-radius: 10px;">', unsafe_allow_html=True)
     # Display all columns
     st.text('All Columns:')
-    st.write(', '.join(df.columns))
+    st.write(', '.join(column_names))
     # Close the frame for all columns
     st.markdown('</div>', unsafe_allow_html=True)
     # Create a frame for feature engineering columns with a different color
@@ -220,44 +214,25 @@ def display_colnames(df: pd.DataFrame):
     # Close the frame for feature engineering columns
     st.markdown('</div>', unsafe_allow_html=True)
 
-def dislpay_frequent_words_from_description(df: pd.DataFrame):
-    # download german stopwords
-    import nltk
-    nltk.download('stopwords')
-    nltk.download('punkt')
-
+@timed()
+def dislpay_frequent_words_from_description(word_cloud_png: bytes, data_path: str):
     st.markdown('&nbsp;')
     st.title('Wordcloud of event descriptions')
-    # Assuming df is your DataFrame
-    df = df
-    # Concatenate all text from the specified column
-    text_data = ' '.join(df['description'].dropna())
-    # Tokenize the text
-    tokens = word_tokenize(text_data)
-    # Remove stopwords
-    german_stopwords = set(stopwords.words('german'))
-    custom_stopwords = {"br", "href", "s", "u", "S", "https", "de", "nofollow", "rel"}
-    german_stopwords = german_stopwords.union(custom_stopwords)
-    filtered_tokens = [word.lower() for word in tokens if word.lower() not in german_stopwords]
-    # Join the filtered tokens back into text
-    filtered_text = ' '.join(filtered_tokens)
-    # Generate a word cloud with German stopwords filtered out
-    wordcloud = WordCloud(width=800, height=400, background_color='white').generate(filtered_text)
-    # Display the word cloud using Matplotlib
-    fig, ax = plt.subplots(figsize=(10, 5))
-    ax.imshow(wordcloud, interpolation='bilinear')
-    ax.axis('off')
-    # Display the figure in Streamlit
-    st.pyplot(fig)
+    # The word cloud is computed offline once per dataset version and served as cached image
+    if word_cloud_png is None:
+        st.info(f'The wordcloud of this dataset was not computed yet, create it with python -m utils.word_frequencies {data_path}')
+        return
+    st.image(word_cloud_png, use_column_width=True)
     st.markdown('NOTE: The above wordcloud was created using natural language processing (NLP) techniques. The wordcloud is based on the event descriptions of the events in the dataset.', help='You need help understanding the wordcloud? Ask the developers!')
 
 # Diagramm
-def generate_activity_type_chart(df: pd.DataFrame):
+@timed()
+def generate_activity_type_chart(summary_cube: pd.DataFrame):
     st.markdown("&nbsp;")
     st.title("Events by Category 💃🏼")
 
-    # Zahlen rechnen
-    activity_counts = df['supercategory'].value_counts()
+    # Zahlen rechnen, the counts are summed up from the precomputed cube
+    activity_counts = count_values(summary_cube, 'supercategory')
 
     # only plot the top 10 categories
     activity_counts = activity_counts[:10]
@@ -273,11 +248,12 @@ def generate_activity_type_chart(df: pd.DataFrame):
     st.plotly_chart(fig)
 
 # Diagramm_Kreis
-def generate_activity_type_pie_chart(df: pd.DataFrame):
+@timed()
+def generate_activity_type_pie_chart(summary_cube: pd.DataFrame):
     st.markdown("&nbsp;")
     st.title("Percentage of Events by Category")
     # Rechnen
-    activity_counts = df['supercategory'].value_counts()
+    activity_counts = count_values(summary_cube, 'supercategory')
 
     # plotly.express
     fig = px.pie(activity_counts, values=activity_counts, names=activity_counts.index, title='Distribution of Activity Types')
@@ -286,12 +262,13 @@ def generate_activity_type_pie_chart(df: pd.DataFrame):
     st.plotly_chart(fig)
 
 # Diagramm_Month
-def generate_activity_time_chart(df: pd.DataFrame):
+@timed()
+def generate_activity_time_chart(summary_cube: pd.DataFrame):
     st.markdown("&nbsp;")
     st.title("Events by Month 📅")
 
     # Month
-    activity_time_counts = df['month'].value_counts()
+    activity_time_counts = count_values(summary_cube, 'month')
 
     # plotly.express
     fig = px.bar(activity_time_counts, x=activity_time_counts.index, y=activity_time_counts.values, 
@@ -301,29 +278,34 @@ def generate_activity_time_chart(df: pd.DataFrame):
     # Zeigen
     st.plotly_chart(fig)
 
-def generate_latitude_longitude_chart(df: pd.DataFrame):
+@timed()
+def generate_latitude_longitude_chart(spatial_index: dict, rows=None):
     st.markdown("&nbsp;")
     st.title("Coordinate Plot of all Events 🌍")
-    coordinate_df = df[["location.name", "location.location.coordinate.lat", "location.location.coordinate.lon"]].dropna()
-    coordinate_df = coordinate_df.rename(columns={"location.name": "Location", "location.location.coordinate.lat": "latitude", "location.location.coordinate.lon": "longitude"})
-    st.map(coordinate_df, color="#FAED27")
+    # the events of a venue are one point and nearby venues are clustered, so only a few points are sent to the map
+    coordinate_df = cluster_points(spatial_index, rows)
+    # the radius of a point (in meters) grows with its number of events
+    coordinate_df['size'] = 20 * np.sqrt(coordinate_df['count'])
+    st.map(coordinate_df, latitude='latitude', longitude='longitude', size='size', color="#FAED27")
 
 
-def visualize_time_of_day(df: pd.DataFrame):
+@timed()
+def visualize_time_of_day(summary_cube: pd.DataFrame):
     # visualize time of day with pie chart
     st.markdown("&nbsp;")
     st.title("Events by Time of Day 🕒")
-    time_of_day_counts = df['time_of_day'].value_counts()
+    time_of_day_counts = count_values(summary_cube, 'time_of_day')
     fig = px.pie(time_of_day_counts, values=time_of_day_counts, names=time_of_day_counts.index, title='Distribution of Time of Day')
     st.plotly_chart(fig)
     st.markdown("The starting hours were grouped into the above 4 times of the day.", help="We used the following classification scheme: Morning: 6am - 12pm, Afternoon: 12pm - 6pm, Evening: 6pm - 12am, Night: 12am - 6am")
 
-def visualize_starting_hour_of_events(df: pd.DataFrame):
+@timed()
+def visualize_starting_hour_of_events(summary_cube: pd.DataFrame):
     # visualize starting hour with line chart
     st.markdown("&nbsp;")
     st.title("Events by Starting Hour 🕰️")
     # Count the occurrences of each starting hour (starting hour is an integer)
-    starting_hour_counts = df['starting_hour'].value_counts()
+    starting_hour_counts = count_values(summary_cube, 'starting_hour')
     
     # Use plotly.express to create the line chart
     fig = px.bar(
@@ -336,13 +318,14 @@ def visualize_starting_hour_of_events(df: pd.DataFrame):
     # Show the line chart
     st.plotly_chart(fig)
 
-def visualize_subcategory_by_supercategory(df: pd.DataFrame):
+@timed()
+def visualize_subcategory_by_supercategory(summary_cube: pd.DataFrame):
     # multiple plots, one for each supercategory
     st.markdown("&nbsp;")
     st.title("Events by Event Type and Subcategory 🧨🎈")
     
     # Create a list of the supercategories
-    supercategories = df['supercategory'].unique()
+    supercategories = get_unique_values(summary_cube, 'supercategory')
     # Create a frame for the plots
     st.markdown('<div style="display: flex; flex-wrap: wrap;">', unsafe_allow_html=True)
 
@@ -350,11 +333,10 @@ def visualize_subcategory_by_supercategory(df: pd.DataFrame):
     for supercategory in supercategories:
         if supercategory == 'familie-kinder' or supercategory == 'anderes':
             continue
-        # Filter the DataFrame for the supercategory
-        filtered_df = df[df['supercategory'] == supercategory]
-        
-        # Count the occurrences of each subcategory for the filtered DataFrame
-        subcategory_counts = filtered_df['subcategory'].value_counts()
+        # Count the occurrences of each subcategory of the supercategory
+        subcategory_counts = count_values(summary_cube, 'subcategory', {'supercategory': supercategory})
+        # categorical columns also count the subcategories of other supercategories, drop them
+        subcategory_counts = subcategory_counts[subcategory_counts > 0]
 
         # Use plotly.express to create the bar chart
         try:
@@ -380,30 +362,58 @@ def visualize_subcategory_by_supercategory(df: pd.DataFrame):
 
 
 
+def display_timings(result_cache: ResultCache):
+    # only shown when the dashboard is started with DASHBOARD_PROFILING=1
+    if not is_enabled():
+        return
+    with st.expander('Debug: timings of this rerun'):
+        st.dataframe(get_breakdown(get_spans()), hide_index=True)
+        # hits and misses of the rendered location tables of this dataset version
+        st.write('Result cache:', result_cache.stats())
+
+
 def main():
-    # Read in the csv-file
-    df = pd.read_csv('data/all_events_dashboard.csv')
-    print(df.shape)
+    # Read in the event store, the parquet file is used when it exists. The dataframe is loaded once per process
+    # and shared by all sessions, so it must not be modified
+    start_rerun()
+    data_path = resolve_event_store_path(f'data/{DATASET}.csv')
+    with span('load_dataset'):
+        df = load_dataset(data_path, columns=DASHBOARD_COLUMNS)
+        filter_index = get_dataset_artifact(data_path, DASHBOARD_COLUMNS, 'filter_index', build_filter_index)
+        # number of events per venue and facet combination for the location tables, written by the preprocessing
+        venue_facet_counts, venue_facet_index = load_venue_facet_counts(data_path, DASHBOARD_COLUMNS)
+        subcategory_lookup = get_dataset_artifact(data_path, DASHBOARD_COLUMNS, 'subcategory_lookup', lambda df: build_value_lookup(df, 'supercategory', 'subcategory'))
+        # the moods that the topic model labeled the events with
+        moods = get_dataset_artifact(data_path, DASHBOARD_COLUMNS, 'moods', lambda df: get_facet_values(df, 'stimmung'))
+        # a new result cache is created whenever the dataset changes
+        result_cache = get_dataset_artifact(data_path, DASHBOARD_COLUMNS, 'result_cache', lambda df: ResultCache())
+        # event counts for the charts of the information tab
+        summary_cube = get_dataset_artifact(data_path, DASHBOARD_COLUMNS, 'summary_cube', build_summary_cube)
+        spatial_index = get_dataset_artifact(data_path, DASHBOARD_COLUMNS, 'spatial_index', build_spatial_index)
+    print(get_dataset_info(data_path, columns=DASHBOARD_COLUMNS))
     display_title()
-    event_type, location_sidebar, season, mood = get_user_preferences()
+    event_type, location_sidebar, season, mood = get_user_preferences(moods)
     # Display the also the subcategories for each supercategory that is selected
-    event_subtype = display_subcategories(event_type, df)
+    event_subtype = display_subcategories(event_type, subcategory_lookup)
     st.write('We will analyze your preferences and show you our recommendations for matching locations in Stuttgart.')
     selected_tab = st.selectbox("Choose top location or all locations", ["Top 5 Locations", "All Locations", "Information about subset of dataset", 'Information about whole dataset'])
     if selected_tab == "Information about subset of dataset":
-        dislpay_frequent_words_from_description(df)
+        dataset_hash = get_dataset_info(data_path, columns=DASHBOARD_COLUMNS)['hash']
+        with span('word_cloud_png'):
+            word_cloud_png = load_word_cloud_png(data_path, dataset_hash)
+        dislpay_frequent_words_from_description(word_cloud_png, data_path)
         expander1 = st.expander("Click to see more information about the dataset")
         with expander1:
-            generate_activity_type_chart(df)
-            generate_activity_type_pie_chart(df)
-            visualize_subcategory_by_supercategory(df)
-            visualize_starting_hour_of_events(df)
-            visualize_time_of_day(df)
-            generate_activity_time_chart(df)
+            generate_activity_type_chart(summary_cube)
+            generate_activity_type_pie_chart(summary_cube)
+            visualize_subcategory_by_supercategory(summary_cube)
+            visualize_starting_hour_of_events(summary_cube)
+            visualize_time_of_day(summary_cube)
+            generate_activity_time_chart(summary_cube)
             show_no_of_events_used(df)
-            #generate_latitude_longitude_chart(df)
+            generate_latitude_longitude_chart(spatial_index)
             #show_google_maps_stuttgart()
-            display_colnames(df)
+            display_colnames(get_event_store_columns(data_path))
     elif selected_tab == "Information about whole dataset":
         # include images
         st.markdown("&nbsp;")
@@ -421,15 +431,17 @@ def main():
             st.image('img/time_of_day_all_events.png', use_column_width=True)
 
     else:
-        display_locations(df, selected_tab, event_type, location_sidebar, season, event_subtype, mood)
+        display_locations(venue_facet_counts, venue_facet_index, result_cache, selected_tab, event_type, location_sidebar, season, event_subtype, mood)
         show_no_of_events_used(df)
-        #generate_latitude_longitude_chart(df)
+        generate_latitude_longitude_chart(spatial_index, select_event_rows(filter_index, event_type, location_sidebar, season, event_subtype, mood))
     
 
 
 
     st.markdown('&nbsp;')
     st.markdown('<div style="text-align:center;">Copyright © 2024 Julius Döbelt and Haoran Huang. All rights reserved.</div>', unsafe_allow_html=True)
+    display_timings(result_cache)
+    finish_rerun(dashboard=os.path.basename(__file__), tab=selected_tab)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,37 @@
+# Write the files of the preprocessing (event store, venue counts, word cloud cache, checkpoints and manifests)
+# to a temporary file in the same directory and move it into place with os.replace. A dashboard that loads the
+# file while it is written, or a run that crashes in the middle of writing it, never sees a partly written file.
+
+import json
+import os
+
+
+def write_atomically(path: str, write):
+    """
+    :param path: path of the file that is replaced
+    :param write: function that writes the file to the path it is called with
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # the extension is kept, e.g. np.savez_compressed adds .npz to other paths
+    root, extension = os.path.splitext(path)
+    tmp_path = f'{root}.{os.getpid()}.tmp{extension}'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_json_atomically(path: str, value, indent: int = None):
+    """
+    :param path: path of the json file that is replaced
+    :param value: value that is written as json
+    :param indent: indent of json.dump
+    """
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f, indent=indent)
+    write_atomically(path, write)
@@ -1,29 +1,236 @@
 # split up the json file stuutgart_events.json into multiple files
 # each file should contain 1000 events
+# The shards are byte ranges of 1000 events of the json file. They are found by scanning the raw bytes for the
+# boundaries of the events without parsing them, and parsed in parallel by parse_shards_in_parallel. A single
+# pass over the whole file is done by extract_json_data_into_dataframe.
 
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import ijson
+import numpy as np
 import pandas as pd
 import json
+from utils.atomic_write import write_json_atomically
 
-def extract_json_data_into_dataframe(json_file_path: str, no_of_entries: int) -> pd.DataFrame:
+# the bytes of the json syntax that the shard scan looks at, bytes.translate maps all other bytes to 0
+OPENING, CLOSING, QUOTE, BACKSLASH = 1, 2, 3, 4
+SYNTAX_TABLE = bytes(OPENING if byte in b'{[' else CLOSING if byte in b'}]' else QUOTE if byte == ord('"')
+                     else BACKSLASH if byte == ord('\\') else 0 for byte in range(256))
+
+
+def get_nested_value(event: dict, column: str):
+    """
+    returns the value of a flattened column name like eventData.location.name from a nested event
+    :param event: event as parsed from the json file
+    :param column: column name with the keys of the nested dictionaries separated by dots
+    :return: the value, None if one of the keys does not exist
+    """
+    value = event
+    for key in column.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _events_to_dataframe(events: list, columns: list = None) -> pd.DataFrame:
+    if columns is None:
+        # flatten the whole batch of events in one call
+        return pd.json_normalize(events)
+    return pd.DataFrame.from_records([[get_nested_value(event, column) for column in columns] for event in events], columns=columns)
+
+
+def iter_json_data_chunks(json_file_path: str, no_of_entries: int = None, chunk_size: int = 1000, predicates: list = None, columns: list = None):
+    """
+    streams the json data from the json file and yields it as pandas dataframes of at most chunk_size rows.
+    Only one chunk of events is held in memory at a time, so memory use is bounded by chunk_size and not by the file size.
+    Events that do not match all predicates are dropped as soon as they are parsed, before they are flattened.
+    :param json_file_path: path to the json file
+    :param no_of_entries: number of entries to be read from the json file (before filtering), None to read all entries
+    :param chunk_size: number of events that are flattened together into one dataframe
+    :param predicates: functions that get the parsed event as dictionary and return whether it should be kept
+    :param columns: flattened column names like eventData.location.name that should be extracted, None to flatten all columns
+    :return: generator of pandas dataframes containing the extracted data
+    """
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be at least 1')
+    predicates = predicates or []
+
+    with open(json_file_path, 'rb') as f:
+        events = ijson.items(f, 'item', use_float=True)
+        if no_of_entries is not None:
+            events = itertools.islice(events, no_of_entries)
+        chunk = []
+        for event in events:
+            if not all(predicate(event) for predicate in predicates):
+                continue
+            chunk.append(event)
+            if len(chunk) == chunk_size:
+                yield _events_to_dataframe(chunk, columns)
+                chunk = []
+        if chunk:
+            yield _events_to_dataframe(chunk, columns)
+
+
+def extract_json_data_into_dataframe(json_file_path: str, no_of_entries: int = None, chunk_size: int = 1000, predicates: list = None, columns: list = None) -> pd.DataFrame:
     """
     extracts the json data from the json file and returns a pandas dataframe
     :param json_file_path: path to the json file
-    :param no_of_entries: number of entries to be extracted from the json file
+    :param no_of_entries: number of entries to be read from the json file (before filtering), None to read all entries
+    :param chunk_size: number of events that are flattened together before they are added to the dataframe
+    :param predicates: functions that get the parsed event as dictionary and return whether it should be kept
+    :param columns: flattened column names like eventData.location.name that should be extracted, None to flatten all columns
     :return: pandas dataframe containing the extracted data
     """
-    df = pd.DataFrame()
+    chunks = list(iter_json_data_chunks(json_file_path, no_of_entries, chunk_size, predicates, columns))
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    # a single concat at the end instead of growing the dataframe event by event
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _get_file_fingerprint(path: str) -> dict:
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _is_escaped(kinds: np.ndarray, position: int, carried_backslashes: int) -> bool:
+    # a quote after an odd number of backslashes is part of a string
+    backslashes = 0
+    while position - backslashes > 0 and kinds[position - backslashes - 1] == BACKSLASH:
+        backslashes += 1
+    if backslashes == position:
+        # the backslashes reach back into the last block
+        backslashes += carried_backslashes
+    return backslashes % 2 == 1
+
+
+def _scan_block(block: bytes, offset: int, state: dict) -> tuple:
+    # find the items of the top level array in a block of the file. The state carries the nesting depth,
+    # whether the block starts inside a string and the number of backslashes at the end of the last block
+    kinds = np.frombuffer(block.translate(SYNTAX_TABLE), dtype=np.uint8)
+    positions = np.flatnonzero(kinds)
+    position_kinds = kinds[positions]
+    quotes = positions[position_kinds == QUOTE]
+    # quotes after a backslash are rare, so they are checked one by one
+    candidates = quotes[(quotes == 0) | (kinds[quotes - 1] == BACKSLASH)]
+    escaped = [position for position in candidates if _is_escaped(kinds, position, state['backslashes'])]
+    if escaped:
+        quotes = np.setdiff1d(quotes, escaped)
+    is_bracket = (position_kinds == OPENING) | (position_kinds == CLOSING)
+    brackets = positions[is_bracket]
+    # brackets after an even number of quotes are not in a string
+    outside = (np.searchsorted(quotes, brackets) + state['in_string']) % 2 == 0
+    brackets = brackets[outside]
+    steps = np.where(position_kinds[is_bracket][outside] == OPENING, 1, -1)
+    depths = state['depth'] + np.cumsum(steps)
+    # the top level array is depth 1, so an item starts with depth 2 and ends when depth 1 is reached again
+    starts = brackets[(steps == 1) & (depths == 2)] + offset
+    ends = brackets[(steps == -1) & (depths == 1)] + offset + 1
+    backslashes = 0
+    while backslashes < len(kinds) and kinds[len(kinds) - backslashes - 1] == BACKSLASH:
+        backslashes += 1
+    state = {
+        'depth': int(depths[-1]) if len(depths) else state['depth'],
+        'in_string': (state['in_string'] + len(quotes)) % 2,
+        'backslashes': backslashes + state['backslashes'] if backslashes == len(kinds) else backslashes,
+    }
+    return starts, ends, state
+
+
+def find_json_array_items(json_file_path: str, block_size: int = 1 << 24) -> np.ndarray:
+    """
+    finds the byte ranges of the items of the top level array of the json file without parsing the items.
+    Only the quotes, backslashes and brackets are looked at, which is much faster than parsing the events.
+    :param json_file_path: path to the json file
+    :param block_size: number of bytes that are scanned at a time
+    :return: array with the start and end (exclusive) byte offset of every object or array in the top level array
+    """
+    state = {'depth': 0, 'in_string': 0, 'backslashes': 0}
+    starts, ends = [], []
+    offset = 0
+    with open(json_file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            block_starts, block_ends, state = _scan_block(block, offset, state)
+            starts.append(block_starts)
+            ends.append(block_ends)
+            offset += len(block)
+    starts = np.concatenate(starts) if starts else np.array([], dtype=np.int64)
+    ends = np.concatenate(ends) if ends else np.array([], dtype=np.int64)
+    if len(starts) != len(ends):
+        raise ValueError(f'{json_file_path} does not end with a complete top level array')
+    return np.column_stack([starts, ends]).astype(np.int64)
+
 
-    f = open(json_file_path, 'r')
-    for i, json_event in enumerate(ijson.items(f, 'item')):
-        single_df = pd.json_normalize(json_event)
-        df = pd.concat([df, single_df], ignore_index=True)
-        if i == no_of_entries:
-            break
-    f.close()
+def split_json_into_shards(json_file_path: str, shard_dir: str, events_per_shard: int = 1000, no_of_entries: int = None) -> list:
+    """
+    splits the top level array of the json file into shards with events_per_shard events each. A shard is the byte
+    range of its events in the json file, so nothing is parsed or written except for a manifest with the ranges.
+    The shards are reused as long as the json file and the parameters did not change.
+    :param json_file_path: path to the json file
+    :param shard_dir: directory where the manifest of the shards is written
+    :param events_per_shard: number of events per shard
+    :param no_of_entries: number of entries to be read from the json file, None to read all entries
+    :return: list of the shards (json file path, start byte, end byte) in the order of the events
+    """
+    if events_per_shard < 1:
+        raise ValueError('events_per_shard must be at least 1')
+    manifest_path = os.path.join(shard_dir, 'manifest.json')
+    # the shards used to be files, manifests of those are not reused
+    source = {'file': _get_file_fingerprint(json_file_path), 'events_per_shard': events_per_shard, 'no_of_entries': no_of_entries, 'shards': 'byte_ranges'}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['source'] == source:
+            return [(json_file_path, start, end) for start, end in manifest['shards']]
 
-    return df
+    items = find_json_array_items(json_file_path)[:no_of_entries]
+    # a shard reaches from the start of its first event to the end of its last event
+    shards = [[int(items[first, 0]), int(items[min(first + events_per_shard, len(items)) - 1, 1])]
+              for first in range(0, len(items), events_per_shard)]
+    write_json_atomically(manifest_path, {'source': source, 'shards': shards})
+    return [(json_file_path, start, end) for start, end in shards]
 
-df = extract_json_data_into_dataframe('stuttgart_events.json', 100)
+
+def read_shard_events(shard: tuple) -> list:
+    """
+    :param shard: shard created by split_json_into_shards
+    :return: list of the events of the shard as parsed from the json file
+    """
+    json_file_path, start, end = shard
+    with open(json_file_path, 'rb') as f:
+        f.seek(start)
+        # the events of the shard are separated by commas like in the top level array
+        return json.loads(b'[' + f.read(end - start) + b']')
+
+
+def _parse_shard(shard: tuple, predicates: list, columns: list) -> pd.DataFrame:
+    predicates = predicates or []
+    events = [event for event in read_shard_events(shard) if all(predicate(event) for predicate in predicates)]
+    if not events:
+        return pd.DataFrame(columns=columns)
+    return _events_to_dataframe(events, columns)
+
+
+def parse_shards_in_parallel(shards: list, predicates: list = None, columns: list = None, n_jobs: int = None) -> pd.DataFrame:
+    """
+    parses the shards in worker processes and merges the results in the order of the shards,
+    so the rows are in the same order as with extract_json_data_into_dataframe
+    :param shards: shards created by split_json_into_shards
+    :param predicates: module level functions that get the parsed event as dictionary and return whether it should be kept
+    :param columns: flattened column names like eventData.location.name that should be extracted, None to flatten all columns
+    :param n_jobs: number of worker processes, None to use all cores
+    :return: pandas dataframe containing the extracted data of all shards
+    """
+    parse_shard = partial(_parse_shard, predicates=predicates, columns=columns)
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        shard_dfs = [shard_df for shard_df in executor.map(parse_shard, shards) if not shard_df.empty]
+    if not shard_dfs:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(shard_dfs, ignore_index=True)
 
 
+if __name__ == "__main__":
+    df = extract_json_data_into_dataframe('stuttgart_events.json', 100)
@@ -1,12 +1,308 @@
-
+import argparse
+import os
+import numpy as np
 import pandas as pd
+from utils.atomic_write import write_atomically
+from utils.data_extraction import get_nested_value
+
+# columns with only a few distinct values, these are stored dictionary encoded in the event store
+CATEGORICAL_COLUMNS = ['season', 'district', 'supercategory', 'subcategory', 'stimmung', 'time_of_day']
+# many events take place at the same location, so the location columns are dictionary encoded in memory as well
+LOCATION_COLUMNS = ['location.name', 'location.location.address.street']
+
+# instead of having to choose location based on postcal code, it would be way nicer to choose location based on district
+# therefore we need to add a column containing the district of the event
+# we can get the district by using a mapping from postcal code to district
+# https://home.meinestadt.de/stuttgart/postleitzahlen
+zip_code_to_district = {
+    "70173": "Europaviertel",
+    "70174": "Relenberg",
+    "70178": "Karlshöhe",
+    "70191": "Am Rosensteinpark",
+    "70193": "Kräherwald",
+    "70195": "Botnang-West",
+    "70197": "Vogelsang",
+    "70199": "Südheim",
+    "70372": "Bad Cannstatt",
+    "70567": "Sternhäule",
+    "70569": "Pfaffenwald",
+    "70437": "Freiberg",
+    "70176": "Rosenberg",
+    "70188": "Uhlandshöhe",
+    "70374": "Im Geiger",
+    "70439": "Zuffenhausen-Elbelen",
+    "70190": "Stöckach",
+    "70180": "Weinsteige",
+    "70182": "Heusteigviertel",
+    "70376": "Neckarvorstadt",
+    "70378": "Mönchfeld",
+    "70597": "Waldau",
+    "70565": "Möhringen-Süd",
+    "70469": "Feuerbach-Ost",
+}
+
+
+def is_event_in_stuttgart(event: dict) -> bool:
+    """
+    Predicate for the streaming extraction of utils/data_extraction, the counterpart of remove_events_not_in_stuttgart
+    :param event: event as parsed from the json file
+    :return: whether the city of the event location is Stuttgart
+    """
+    return get_nested_value(event, 'eventData.location.location.address.city') == 'Stuttgart'
+
+
+def is_event_not_cancelled(event: dict) -> bool:
+    """
+    Predicate for the streaming extraction of utils/data_extraction, the counterpart of remove_cancelled_events
+    :param event: event as parsed from the json file
+    :return: whether the event is marked as not cancelled
+    """
+    cancelled = get_nested_value(event, 'eventData.cancelled')
+    return cancelled is not None and cancelled == False
+
+
+def is_event_on_wednesday(event: dict) -> bool:
+    """
+    Predicate for the streaming extraction of utils/data_extraction, the counterpart of keep_wednesdays
+    :param event: event as parsed from the json file
+    :return: whether the event starts on a Wednesday (in UTC like keep_wednesdays)
+    """
+    start_date = get_nested_value(event, 'eventData.startDate')
+    if start_date is None:
+        return False
+    try:
+        start_date = pd.Timestamp(start_date)
+    except ValueError:
+        return False
+    if start_date.tzinfo is not None:
+        start_date = start_date.tz_convert('UTC')
+    return start_date.dayofweek == 2
 
 
 def remove_events_not_in_stuttgart(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Remove all events not in Stuttgart by looking at the evntData.location.location.city column
+    Remove all events not in Stuttgart by looking at the evntData.location.location.city column.
+    Use is_event_in_stuttgart to drop these events while the json file is parsed.
     :param df: dataframe containing the events
     :return: dataframe containing only events in Stuttgart (might be the same as inpt df)
     """
     df = df[df['eventData.location.location.address.city'] == 'Stuttgart']
     return df
+
+
+def remove_event_data_prefix(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rename the flattened eventData.* columns to the names used by the notebook and the dashboards,
+    e.g. eventData.location.name becomes location.name. Top level columns with the same name are replaced.
+    :param df: dataframe created by extract_json_data_into_dataframe
+    :return: dataframe with renamed columns
+    """
+    prefix = 'eventData.'
+    renamed_columns = {column: column[len(prefix):] for column in df.columns if column.startswith(prefix)}
+    df = df.drop(columns=[column for column in renamed_columns.values() if column in df.columns])
+    return df.rename(columns=renamed_columns)
+
+
+def remove_cancelled_events(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Only keep events that were not cancelled
+    :param df: dataframe containing the events
+    :return: dataframe containing only events that were not cancelled
+    """
+    return df[df['cancelled'] == False]
+
+
+def remove_sparse_columns(df: pd.DataFrame, max_missing_ratio: float = 0.8) -> pd.DataFrame:
+    """
+    Drop columns with more than max_missing_ratio missing values
+    :param df: dataframe containing the events
+    :param max_missing_ratio: maximal ratio of missing values of a column that is kept
+    :return: dataframe without the sparse columns
+    """
+    return df.dropna(thresh=int(np.ceil(df.shape[0] * (1 - max_missing_ratio))), axis=1)
+
+
+def keep_wednesdays(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parse the startDate column, add the column dayofweek and only keep events on Wednesdays
+    :param df: dataframe containing the events
+    :return: dataframe containing only events on Wednesdays
+    """
+    df = df.copy()
+    if not pd.api.types.is_datetime64_any_dtype(df['startDate']):
+        df['startDate'] = pd.to_datetime(df['startDate'], format='mixed', utc=True)
+    df['dayofweek'] = df['startDate'].dt.dayofweek
+    df = df[df['dayofweek'] == 2]
+    return df.reset_index(drop=True)
+
+
+def get_season(date: pd.Timestamp) -> str:
+    """
+    Returns the season of an event based on the startDate.
+
+    :param date: date for which the season should be determined
+    :return: season of the given date
+    """
+    # spring
+    if date.month >= 3 and date.month <= 5:
+        return 'spring'
+    # summer
+    elif date.month >= 6 and date.month <= 8:
+        return 'summer'
+    # autumn
+    elif date.month >= 9 and date.month <= 11:
+        return 'autumn'
+    # winter
+    else:
+        return 'winter'
+
+
+def get_time_of_day(time: int) -> str:
+    """
+    returns the time of day of a given start time
+    :param time: time for which the time of day should be determined
+    :return: time of day of the given time
+    """
+    # morning
+    if time >= 6 and time < 12:
+        return 'morning'
+    # afternoon
+    elif time >= 12 and time < 18:
+        return 'afternoon'
+    # evening
+    elif time >= 18 and time < 24:
+        return 'evening'
+    # night
+    else:
+        return 'night'
+
+
+def get_district_from_postcal_code(postcalCode: int):
+    """
+    returns the district of a given postal code
+    :param postcalCode: postal code for which the district should be determined
+    :return: district of the given postal code
+    """
+    try:
+        district = zip_code_to_district[str(postcalCode)]
+    except KeyError:
+        district = "Other"
+    return district
+
+
+def add_district(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the column district derived from the postal code of the location
+    :param df: dataframe containing the events
+    :return: dataframe with the new column
+    """
+    df = df.copy()
+    df['district'] = df['location.location.address.postalCode'].apply(get_district_from_postcal_code)
+    return df
+
+
+def extract_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Extracts the supercategory and subcategory from the location.category column
+    :param df: dataframe containing the events
+    :return: dataframe containing the events with two new columns supercategory and subcategory
+    """
+    df = df.copy()
+    df['supercategory'] = np.where(df['location.category'].notnull(), df['location.category'].str.split('/').str[0], 'anderes')
+    df['subcategory'] = np.where(df['location.category'].notnull(), df['location.category'].str.split('/').str[1], 'anderes')
+    # everything to lowercase
+    df['supercategory'] = df['supercategory'].str.lower()
+    df['subcategory'] = df['subcategory'].str.lower()
+    # if subcategory has no value, set it to "No Subcategory"
+    df['subcategory'] = np.where(df['subcategory'].isnull(), 'no subcategory', df['subcategory'])
+    return df
+
+
+def convert_categorical_columns(df: pd.DataFrame, columns: list = CATEGORICAL_COLUMNS) -> pd.DataFrame:
+    """
+    Convert the facet columns of the preprocessed events to categorical dtype
+    :param df: dataframe containing the preprocessed events
+    :param columns: columns that are converted
+    :return: dataframe where all of the columns that exist are categorical
+    """
+    df = df.copy()
+    for column in columns:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
+
+
+def compact_event_table(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce the memory of the events that the dashboards keep in memory: the facet and location columns are
+    dictionary encoded and the numeric columns use the narrowest dtype, e.g. int8 for month and starting_hour
+    and float32 for the coordinates
+    :param df: dataframe containing the preprocessed events
+    :return: compact dataframe with the same values
+    """
+    df = convert_categorical_columns(df, CATEGORICAL_COLUMNS + LOCATION_COLUMNS)
+    for column in df.columns:
+        if pd.api.types.is_bool_dtype(df[column]):
+            continue
+        if pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+        elif pd.api.types.is_float_dtype(df[column]):
+            df[column] = df[column].astype(np.float32)
+    return df
+
+
+def save_event_store(df: pd.DataFrame, path: str):
+    """
+    Save the preprocessed events as a typed columnar parquet file, which is what the dashboards load
+    :param df: dataframe containing the preprocessed events
+    :param path: path of the parquet file, it is replaced atomically so the dashboards never load a partial file
+    """
+    df = convert_categorical_columns(df)
+    write_atomically(path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+
+
+def load_event_store(path: str, columns: list = None) -> pd.DataFrame:
+    """
+    Load the preprocessed events. Parquet files are memory mapped and only the requested columns are read,
+    csv files are still supported for data that was not converted yet.
+    :param path: path of the parquet or csv file
+    :param columns: columns that should be loaded, None to load all columns
+    :return: dataframe containing the preprocessed events
+    """
+    if path.endswith('.csv'):
+        return convert_categorical_columns(pd.read_csv(path, usecols=columns))
+    return pd.read_parquet(path, columns=columns, memory_map=True)
+
+
+def get_event_store_columns(path: str) -> list:
+    """
+    Return all column names of the event store without loading the data
+    :param path: path of the parquet or csv file
+    :return: list of column names
+    """
+    if path.endswith('.csv'):
+        return pd.read_csv(path, nrows=0).columns.tolist()
+    import pyarrow.parquet as pq
+    return pq.read_schema(path).names
+
+
+def resolve_event_store_path(csv_path: str) -> str:
+    """
+    Prefer the parquet event store next to a csv file if it was already created
+    :param csv_path: path of the csv file
+    :return: path of the parquet file if it exists, otherwise the csv path
+    """
+    parquet_path = os.path.splitext(csv_path)[0] + '.parquet'
+    if os.path.exists(parquet_path):
+        return parquet_path
+    return csv_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert preprocessed event csv files into the parquet event store')
+    parser.add_argument('csv_files', nargs='+', help='csv files created by the step-by-step-walkthrough notebook')
+    args = parser.parse_args()
+    for csv_file in args.csv_files:
+        parquet_file = os.path.splitext(csv_file)[0] + '.parquet'
+        save_event_store(pd.read_csv(csv_file), parquet_file)
+        print(f'{csv_file} -> {parquet_file}')
@@ -0,0 +1,119 @@
+# Process wide cache for the event datasets used by the dashboards.
+# Streamlit executes the dashboard script again on every interaction, but imported modules stay loaded,
+# so every session of the same process shares the dataframes that are kept here.
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import pandas as pd
+from utils.data_preprocessing import load_event_store, compact_event_table
+
+logger = logging.getLogger(__name__)
+
+_datasets = {}
+_lock = threading.Lock()
+
+
+def compute_file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Compute the sha256 hash of a file without reading it into memory at once
+    :param path: path of the file
+    :param block_size: number of bytes read at a time
+    :return: hex digest of the file content
+    """
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def _dataset_key(path: str, columns: list) -> tuple:
+    return os.path.abspath(path), tuple(columns) if columns is not None else None
+
+
+def load_dataset(path: str, columns: list = None) -> pd.DataFrame:
+    """
+    Load the event dataset once per process and return the same dataframe to every caller.
+    The file is only read again when its content changed: a changed modification time triggers a hash
+    comparison and the data is reloaded if the hash differs.
+    The returned dataframe is shared by all sessions and must not be modified in place, it is compacted with
+    compact_event_table.
+    :param path: path of the parquet or csv file
+    :param columns: columns that should be loaded, None to load all columns
+    :return: dataframe containing the events
+    """
+    key = _dataset_key(path, columns)
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        entry = _datasets.get(key)
+        if entry is not None and entry['mtime'] == mtime:
+            return entry['df']
+        file_hash = compute_file_hash(path)
+        if entry is not None and entry['hash'] == file_hash:
+            # the file was touched but not changed
+            entry['mtime'] = mtime
+            return entry['df']
+
+        start = time.perf_counter()
+        # the compact table is shared by all sessions, so its size limits the number of sessions per process
+        df = compact_event_table(load_event_store(path, columns=columns))
+        load_seconds = time.perf_counter() - start
+        entry = {
+            'df': df,
+            'mtime': mtime,
+            'hash': file_hash,
+            'load_seconds': load_seconds,
+            'memory_bytes': int(df.memory_usage(deep=True).sum()),
+            'artifacts': {},
+            'artifact_locks': {},
+        }
+        _datasets[key] = entry
+        logger.info('Loaded %s with shape %s in %.2fs, memory footprint %.1f MB',
+                    path, df.shape, load_seconds, entry['memory_bytes'] / 1e6)
+        return df
+
+
+def get_dataset_info(path: str, columns: list = None) -> dict:
+    """
+    Return the statistics of a dataset that was loaded with load_dataset
+    :param path: path of the parquet or csv file
+    :param columns: the columns that were passed to load_dataset
+    :return: dictionary with shape, hash, load time in seconds and memory footprint in bytes, None if the dataset is not loaded
+    """
+    entry = _datasets.get(_dataset_key(path, columns))
+    if entry is None:
+        return None
+    return {
+        'path': path,
+        'shape': entry['df'].shape,
+        'hash': entry['hash'],
+        'load_seconds': entry['load_seconds'],
+        'memory_bytes': entry['memory_bytes'],
+    }
+
+
+def get_dataset_artifact(path: str, columns: list, name: str, builder):
+    """
+    Return a structure derived from a dataset, e.g. an index. It is built once per loaded version of the
+    dataset and shared like the dataframe itself, when the dataset is reloaded it is built again.
+    :param path: path of the parquet or csv file
+    :param columns: the columns that are passed to load_dataset
+    :param name: name under which the structure is cached
+    :param builder: function that builds the structure from the dataframe
+    :return: the cached structure
+    """
+    load_dataset(path, columns=columns)
+    with _lock:
+        entry = _datasets[_dataset_key(path, columns)]
+        if name in entry['artifacts']:
+            return entry['artifacts'][name]
+        artifact_lock = entry['artifact_locks'].setdefault(name, threading.Lock())
+    # the builder only holds the lock of its artifact, so other sessions can load datasets and use other
+    # artifacts while it runs, and sessions that need the same artifact wait for it instead of building it again
+    with artifact_lock:
+        if name not in entry['artifacts']:
+            entry['artifacts'][name] = builder(entry['df'])
+        return entry['artifacts'][name]
@@ -0,0 +1,55 @@
+# Vectorized time features derived from the startDate column.
+# The labels are looked up in small arrays indexed by month and hour instead of calling get_season and
+# get_time_of_day of utils/data_preprocessing for every event, the results are the same.
+
+import numpy as np
+import pandas as pd
+
+SEASONS = ['spring', 'summer', 'autumn', 'winter']
+TIMES_OF_DAY = ['morning', 'afternoon', 'evening', 'night']
+
+# index is the month, 0 is used for a missing month which get_season classifies as winter
+SEASON_CODE_BY_MONTH = np.array([3, 3, 3, 0, 0, 0, 1, 1, 1, 2, 2, 2, 3], dtype=np.int8)
+# index is the hour, 24 is used for a missing hour which get_time_of_day classifies as night
+TIME_OF_DAY_CODE_BY_HOUR = np.array([3] * 6 + [0] * 6 + [1] * 6 + [2] * 6 + [3], dtype=np.int8)
+
+
+def get_seasons(months: pd.Series) -> pd.Series:
+    """
+    Vectorized get_season
+    :param months: series of months (1 - 12), missing values are allowed
+    :return: categorical series with the season of every month
+    """
+    month_index = months.fillna(0).to_numpy().astype(np.int64)
+    codes = SEASON_CODE_BY_MONTH[month_index]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=SEASONS), index=months.index)
+
+
+def get_times_of_day(hours: pd.Series) -> pd.Series:
+    """
+    Vectorized get_time_of_day
+    :param hours: series of starting hours (0 - 23), missing values are allowed
+    :return: categorical series with the time of day of every hour
+    """
+    hour_index = hours.fillna(24).to_numpy().astype(np.int64)
+    codes = TIME_OF_DAY_CODE_BY_HOUR[hour_index]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=TIMES_OF_DAY), index=hours.index)
+
+
+def add_time_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Derive dayofweek, year, month, starting_hour, season and time_of_day from the startDate column
+    :param df: dataframe containing the events, startDate is parsed if it is not a datetime column yet
+    :return: dataframe with the new columns, season and time_of_day are categorical
+    """
+    df = df.copy()
+    if not pd.api.types.is_datetime64_any_dtype(df['startDate']):
+        df['startDate'] = pd.to_datetime(df['startDate'], format='mixed', utc=True)
+    start_dates = df['startDate'].dt
+    df['dayofweek'] = start_dates.dayofweek
+    df['year'] = start_dates.year
+    df['month'] = start_dates.month
+    df['starting_hour'] = start_dates.hour
+    df['season'] = get_seasons(df['month'])
+    df['time_of_day'] = get_times_of_day(df['starting_hour'])
+    return df
@@ -0,0 +1,87 @@
+# Bitmap index over the facet columns the dashboard sidebar filters on, and lookups between facet values.
+# For every value of a facet column the rows with that value are stored as a packed bitset (one bit per row),
+# so a filter combination is answered by OR-ing the bitsets of the selected values of each column and AND-ing
+# the results of the columns instead of scanning the whole dataframe.
+
+import numpy as np
+import pandas as pd
+
+FACET_COLUMNS = ['season', 'district', 'supercategory', 'subcategory', 'stimmung']
+
+
+def build_filter_index(df: pd.DataFrame, columns: list = FACET_COLUMNS) -> dict:
+    """
+    Build the bitmap index for the facet columns of the events
+    :param df: dataframe containing the events
+    :param columns: facet columns that should be indexed
+    :return: dictionary with the number of rows and a bitset per value of each column
+    """
+    bitsets = {}
+    for column in columns:
+        codes, values = pd.factorize(df[column])
+        bitsets[column] = {value: np.packbits(codes == code) for code, value in enumerate(values)}
+    return {'num_rows': len(df), 'bitsets': bitsets}
+
+
+def _empty_bitset(filter_index: dict) -> np.ndarray:
+    return np.zeros((filter_index['num_rows'] + 7) // 8, dtype=np.uint8)
+
+
+def select_bitset(filter_index: dict, column: str, values: list) -> np.ndarray:
+    """
+    Return the bitset of all rows where the column has one of the values, like df[column].isin(values)
+    :param filter_index: index created by build_filter_index
+    :param column: indexed facet column
+    :param values: values of the column that should be selected
+    :return: packed bitset of the selected rows
+    """
+    selection = _empty_bitset(filter_index)
+    column_bitsets = filter_index['bitsets'][column]
+    for value in values:
+        bitset = column_bitsets.get(value)
+        if bitset is not None:
+            np.bitwise_or(selection, bitset, out=selection)
+    return selection
+
+
+def select_rows(filter_index: dict, selections: dict) -> np.ndarray:
+    """
+    Return the positions of the rows that match all selections
+    :param filter_index: index created by build_filter_index
+    :param selections: dictionary with an indexed column as key and the list of selected values as value
+    :return: sorted array with the positions of the matching rows
+    """
+    result = None
+    for column, values in selections.items():
+        selection = select_bitset(filter_index, column, values)
+        result = selection if result is None else np.bitwise_and(result, selection, out=result)
+    if result is None:
+        return np.arange(filter_index['num_rows'])
+    return np.flatnonzero(np.unpackbits(result, count=filter_index['num_rows']))
+
+
+def build_value_lookup(df: pd.DataFrame, column: str, other_column: str) -> dict:
+    """
+    Precompute which values of other_column occur together with each value of column, e.g. the subcategories
+    of every supercategory. The values are in order of their first occurrence like
+    df[df[column] == value][other_column].unique() without missing values.
+    :param df: dataframe containing the events
+    :param column: column whose values are the keys of the lookup, e.g. supercategory
+    :param other_column: column whose values are looked up, e.g. subcategory
+    :return: dictionary with the values of column as keys and tuples of values of other_column as values
+    """
+    pairs = df[[column, other_column]].dropna(subset=[other_column]).drop_duplicates()
+    lookup = {}
+    for value, other_value in pairs.itertuples(index=False):
+        lookup.setdefault(value, []).append(other_value)
+    return {value: tuple(other_values) for value, other_values in lookup.items()}
+
+
+def get_facet_values(df: pd.DataFrame, column: str) -> list:
+    """
+    The values of a facet that occur in the data, e.g. the stimmung labels that the topic model wrote into the store
+    :param df: dataframe containing the events
+    :param column: facet column, e.g. stimmung
+    :return: sorted list of the values without missing values
+    """
+    return sorted(df[column].dropna().unique())
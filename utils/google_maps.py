@@ -0,0 +1,58 @@
+# Google Maps search links of the venues for the location tables of the dashboards.
+# The urls are built with string array operations over the Location and Address columns, and the anchor html
+# of a venue is cached, because it never changes and the same venues are shown again and again.
+
+import html
+import threading
+from functools import partial
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+
+GOOGLE_MAPS_SEARCH_URL = 'https://www.google.com/maps/search/?api=1&query='
+# the cache is cleared when it holds more venues, the datasets have a few thousand venues
+MAX_CACHED_LINKS = 100000
+
+_links = {}
+_lock = threading.Lock()
+
+
+def get_google_maps_urls(locations: pd.Series, addresses: pd.Series) -> pd.Series:
+    """
+    Create the url of the Google Maps search of every venue, the search text is url encoded
+    :param locations: names of the venues
+    :param addresses: streets of the venues, missing addresses are left out of the search
+    :return: series with the url of every venue
+    """
+    locations = pd.Series(np.asarray(locations, dtype=object)).astype(str)
+    addresses = pd.Series(np.asarray(addresses, dtype=object))
+    # ',' + missing address is missing and becomes an empty string
+    queries = locations + (',' + addresses.astype(str).where(addresses.notna())).fillna('') + ', Stuttgart'
+    return GOOGLE_MAPS_SEARCH_URL + queries.map(partial(quote, safe=','))
+
+
+def create_google_maps_links(locations: pd.Series, addresses: pd.Series) -> np.ndarray:
+    """
+    Create the link to the Google Maps search of every row of a location table. The links are built once per
+    venue and cached, only the venues that are not cached yet are built.
+    :param locations: the Location column
+    :param addresses: the Address column
+    :return: array with the anchor html of every row
+    """
+    locations = np.asarray(locations, dtype=object)
+    addresses = np.asarray(addresses, dtype=object)
+    # a venue is the combination of name and address, missing addresses have the key None
+    keys = list(zip(locations, [address if isinstance(address, str) else None for address in addresses]))
+    with _lock:
+        links = [_links.get(key) for key in keys]
+    missing = list(dict.fromkeys(key for key, link in zip(keys, links) if link is None))
+    if missing:
+        new_locations = pd.Series([location for location, _ in missing], dtype=object).astype(str)
+        urls = get_google_maps_urls(new_locations, [address for _, address in missing])
+        new_links = dict(zip(missing, '<a href="' + urls + '" target="_blank">Find ' + new_locations.map(html.escape) + ' on Maps</a>'))
+        links = [link if link is not None else new_links[key] for key, link in zip(keys, links)]
+        with _lock:
+            if len(_links) > MAX_CACHED_LINKS:
+                _links.clear()
+            _links.update(new_links)
+    return np.array(links, dtype=object)
@@ -0,0 +1,37 @@
+# Html rendering of the location tables of the dashboards. The table is written row by row and gives the same
+# html as DataFrame.to_html(escape=False, index=False, justify='center'), but without the formatting machinery
+# of pandas, which dominates for the few rows of a page.
+
+import pandas as pd
+
+
+def _format_cell(value) -> str:
+    # missing values are shown like to_html shows them
+    if value is None:
+        return 'None'
+    if not isinstance(value, str) and pd.isna(value):
+        return 'NaN'
+    return str(value)
+
+
+def iter_html_table(df: pd.DataFrame):
+    """
+    Write the html table of a dataframe piece by piece, the cells are not escaped
+    :param df: dataframe with the rows of the table
+    :return: generator of the html strings of the table, one per row after the header
+    """
+    yield '<table border="1" class="dataframe">\n  <thead>\n    <tr style="text-align: center;">\n'
+    for column in df.columns:
+        yield f'      <th>{column}</th>\n'
+    yield '    </tr>\n  </thead>\n  <tbody>\n'
+    for row in df.itertuples(index=False, name=None):
+        yield '    <tr>\n' + ''.join(f'      <td>{_format_cell(value)}</td>\n' for value in row) + '    </tr>\n'
+    yield '  </tbody>\n</table>'
+
+
+def render_html_table(df: pd.DataFrame) -> str:
+    """
+    :param df: dataframe with the rows of the table
+    :return: the html of the table
+    """
+    return ''.join(iter_html_table(df))
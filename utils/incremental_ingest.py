@@ -0,0 +1,186 @@
+# Incremental ingest of a refreshed stuttgart_events.json into the parquet event store of the dashboards.
+# Every event is identified by its id and a hash of its content. Only events that are new or changed since the
+# last ingest go through the per-event stages of utils/preprocessing_pipeline and are labeled with the saved
+# topic model of utils/topic_model, events that were removed from the dump (or are cancelled now) are dropped
+# from the store. The ids and hashes of the last ingest are stored next to the event store, and the venue facet
+# counts of utils/venue_profiles and the word cloud of utils/word_frequencies are built again when the store changed.
+#
+# Usage: python -m utils.incremental_ingest stuttgart_events.json --store data/all_events_dashboard.parquet \
+#            --topic-model models/stimmung_topic_model.pkl
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import ijson
+import pandas as pd
+
+from utils.atomic_write import write_json_atomically
+from utils.data_preprocessing import (is_event_in_stuttgart, is_event_not_cancelled, is_event_on_wednesday,
+                                      remove_sparse_columns, load_event_store, save_event_store)
+from utils.dataset_loader import compute_file_hash
+from utils.preprocessing_pipeline import STAGES
+from utils.topic_model import load_topic_model, predict_stimmung
+from utils.venue_profiles import save_venue_facet_counts
+from utils.word_frequencies import build_word_cloud_cache
+
+logger = logging.getLogger(__name__)
+
+# stages of the pipeline that only look at a single event, the other stages (parsing, dropping sparse columns
+# and sampling) depend on the whole dataset
+DELTA_STAGES = ['clean', 'wednesdays', 'time_features', 'district', 'categories']
+
+
+def get_event_hash(event: dict) -> str:
+    """
+    :param event: event as parsed from the json file
+    :return: hash of the content of the event, it does not depend on the order of the keys
+    """
+    content = json.dumps(event, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
+def get_state_path(store_path: str) -> str:
+    return os.path.splitext(store_path)[0] + '.ingest_state.json'
+
+
+def load_ingest_state(state_path: str) -> dict:
+    """
+    :param state_path: path of the state file written by the last ingest
+    :return: dictionary with the event id as key and the hash of the event as value, empty if there was no ingest yet
+    """
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def save_ingest_state(event_hashes: dict, state_path: str):
+    write_json_atomically(state_path, event_hashes)
+
+
+def find_changed_events(json_file_path: str, previous_hashes: dict, id_column: str = 'id') -> tuple:
+    """
+    Stream the json file and compare every event with the last ingest
+    :param json_file_path: path to the json file
+    :param previous_hashes: event hashes of the last ingest
+    :param id_column: top level key of the event id
+    :return: tuple of the hashes of all events in the file and the list of events that are new or changed
+    """
+    event_hashes = {}
+    changed_events = {}
+    with open(json_file_path, 'rb') as f:
+        for event in ijson.items(f, 'item', use_float=True):
+            event_id = event.get(id_column)
+            if event_id is None:
+                raise ValueError(f'Event without {id_column}, the incremental ingest needs an id for every event')
+            event_id = str(event_id)
+            event_hash = get_event_hash(event)
+            event_hashes[event_id] = event_hash
+            if previous_hashes.get(event_id) != event_hash:
+                # a later event with the same id replaces the earlier one
+                changed_events[event_id] = event
+            else:
+                changed_events.pop(event_id, None)
+    return event_hashes, list(changed_events.values())
+
+
+def preprocess_events(events: list, topic_model: dict) -> pd.DataFrame:
+    """
+    Run the per-event stages of the preprocessing pipeline and label the events with the topic model
+    :param events: events as parsed from the json file
+    :param topic_model: topic model loaded by load_topic_model
+    :return: dataframe containing the events that are kept by the pipeline
+    """
+    # only the changed events that end up in the store are normalized and labeled, the wednesdays stage
+    # below still adds the dayofweek column
+    predicates = [is_event_not_cancelled, is_event_in_stuttgart, is_event_on_wednesday]
+    events = [event for event in events if all(predicate(event) for predicate in predicates)]
+    if not events:
+        return pd.DataFrame()
+    df = pd.json_normalize(events)
+    stages = dict(STAGES)
+    for name in DELTA_STAGES:
+        df = stages[name](df)
+    df['stimmung'] = predict_stimmung(topic_model, df['description'])
+    return df
+
+
+def ingest(json_file_path: str, store_path: str, topic_model_path: str, id_column: str = 'id') -> dict:
+    """
+    Merge the new, changed and removed events of the json file into the event store
+    :param json_file_path: path to the refreshed json file
+    :param store_path: path of the parquet event store, it is created if it does not exist yet
+    :param topic_model_path: path of the topic model saved by the notebook
+    :param id_column: top level key of the event id
+    :return: dictionary with the number of added, updated and removed events and the size of the store
+    """
+    state_path = get_state_path(store_path)
+    event_hashes, changed_events = find_changed_events(json_file_path, load_ingest_state(state_path), id_column)
+    logger.info('%s of %s events are new or changed', len(changed_events), len(event_hashes))
+
+    topic_model = load_topic_model(topic_model_path)
+    delta_df = preprocess_events(changed_events, topic_model) if changed_events else pd.DataFrame()
+    relabeled = False
+    if os.path.exists(store_path):
+        store_df = load_event_store(store_path)
+        if id_column not in store_df.columns:
+            raise ValueError(f'The event store {store_path} has no {id_column} column, create it with utils.preprocessing_pipeline first')
+        if 'stimmung' not in store_df.columns:
+            # stores of the pipeline without the stimmung stage are labeled completely, otherwise the stimmung
+            # of the new events would be dropped with the columns that the store does not have
+            logger.info('The event store has no stimmung, all %s events are labeled', len(store_df))
+            store_df['stimmung'] = predict_stimmung(topic_model, store_df['description'])
+            relabeled = True
+        store_ids = store_df[id_column].astype(str)
+        # events that are not in the json file anymore and the old version of changed events
+        changed_ids = {str(event[id_column]) for event in changed_events}
+        deleted = ~store_ids.isin(event_hashes.keys()) | store_ids.isin(changed_ids)
+        if not delta_df.empty:
+            delta_df = delta_df.reindex(columns=store_df.columns)
+        kept_df = store_df[~deleted]
+    else:
+        store_ids = pd.Series([], dtype=str)
+        deleted = pd.Series([], dtype=bool)
+        if not delta_df.empty:
+            delta_df = remove_sparse_columns(delta_df, max_missing_ratio=0.8)
+        kept_df = pd.DataFrame(columns=delta_df.columns)
+
+    delta_ids = set(delta_df[id_column].astype(str)) if not delta_df.empty else set()
+    deleted_ids = set(store_ids[deleted])
+    report = {
+        'added': len(delta_ids - set(store_ids)),
+        'updated': len(delta_ids & deleted_ids),
+        'removed': len(deleted_ids - delta_ids),
+    }
+    if report['added'] or report['updated'] or report['removed'] or relabeled or not os.path.exists(store_path):
+        frames = [df for df in [kept_df, delta_df] if not df.empty]
+        merged_df = pd.concat(frames, ignore_index=True) if frames else kept_df
+        # the dashboards filter by the stimmung, a store with unlabeled events is not written
+        if len(merged_df) and ('stimmung' not in merged_df.columns or merged_df['stimmung'].isna().any()):
+            raise ValueError(f'Not every event of the merged event store has a stimmung, {store_path} is not written')
+        save_event_store(merged_df, store_path)
+        store_hash = compute_file_hash(store_path)
+        save_venue_facet_counts(merged_df, store_path, store_hash)
+        build_word_cloud_cache(store_path, store_hash, merged_df['description'])
+        report['events'] = len(merged_df)
+    else:
+        report['events'] = len(store_ids)
+    # the state is only written after the store, an interrupted ingest is repeated completely
+    save_ingest_state(event_hashes, state_path)
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Merge new, changed and removed events of stuttgart_events.json into the event store')
+    parser.add_argument('json_file', help='path to the refreshed stuttgart_events.json')
+    parser.add_argument('--store', default='data/all_events_dashboard.parquet', help='path of the parquet event store')
+    parser.add_argument('--topic-model', default='models/stimmung_topic_model.pkl', help='topic model saved by the notebook')
+    parser.add_argument('--id-column', default='id', help='top level key of the event id in the json file')
+    args = parser.parse_args()
+
+    report = ingest(args.json_file, args.store, args.topic_model, args.id_column)
+    logger.info('Added %s, updated %s and removed %s events, the store contains %s events',
+                report['added'], report['updated'], report['removed'], report['events'])
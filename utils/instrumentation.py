@@ -0,0 +1,142 @@
+# Timing spans for the hot paths of the dashboards. Spans are only collected when the environment variable
+# DASHBOARD_PROFILING is set (e.g. DASHBOARD_PROFILING=1 streamlit run dashboard_demo.py), otherwise span and
+# timed only check a flag. Every rerun of a dashboard script collects its own spans. They are shown in a debug
+# expander of the dashboard and logged as one json line per rerun, by default to stderr or to the file given by
+# DASHBOARD_PROFILING_LOG, so the timings of many sessions can be aggregated.
+
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+_enabled = os.environ.get('DASHBOARD_PROFILING', '') not in ('', '0')
+# streamlit runs every session in its own thread, so the spans of a rerun are collected per thread
+_local = threading.local()
+
+
+def _configure_logger():
+    # the json lines are written as they are, without the format of the dashboard logs
+    log_path = os.environ.get('DASHBOARD_PROFILING_LOG')
+    handler = logging.FileHandler(log_path) if log_path else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+if _enabled:
+    _configure_logger()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(enabled: bool):
+    """
+    Switch the collection of spans on or off, e.g. for the benchmarks
+    :param enabled: whether spans are collected
+    """
+    global _enabled
+    if enabled and not _enabled and not logger.handlers:
+        _configure_logger()
+    _enabled = enabled
+
+
+def start_rerun():
+    """
+    Start collecting the spans of a new rerun of the dashboard script in this thread
+    """
+    if not _enabled:
+        return
+    _local.spans = []
+    _local.depth = 0
+    _local.start = time.perf_counter()
+
+
+@contextlib.contextmanager
+def span(name: str):
+    """
+    Measure the time of a block of code, spans can be nested
+    :param name: name of the span, e.g. the name of the function
+    """
+    spans = getattr(_local, 'spans', None) if _enabled else None
+    if spans is None:
+        yield
+        return
+    depth = _local.depth
+    _local.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _local.depth = depth
+        spans.append({
+            'name': name,
+            'depth': depth,
+            'start_ms': (start - _local.start) * 1000,
+            'duration_ms': (end - start) * 1000,
+        })
+
+
+def timed(name: str = None):
+    """
+    Decorator that measures every call of a function as span
+    :param name: name of the span, the name of the function if None
+    """
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_spans() -> list:
+    """
+    :return: the spans of the current rerun in the order in which they were started
+    """
+    return sorted(getattr(_local, 'spans', None) or [], key=lambda collected_span: collected_span['start_ms'])
+
+
+def get_breakdown(spans: list) -> pd.DataFrame:
+    """
+    :param spans: spans returned by get_spans
+    :return: dataframe with one row per span, nested spans are indented
+    """
+    breakdown = pd.DataFrame(spans, columns=['name', 'depth', 'start_ms', 'duration_ms'])
+    breakdown['name'] = ['    ' * depth + name for name, depth in zip(breakdown['name'], breakdown['depth'])]
+    return breakdown[['name', 'start_ms', 'duration_ms']].round(2)
+
+
+def finish_rerun(**fields) -> dict:
+    """
+    Stop collecting the spans of the current rerun and log them as one json line
+    :param fields: further fields of the log line, e.g. the name of the dashboard and the selected tab
+    :return: the logged record, None if no spans were collected
+    """
+    spans = getattr(_local, 'spans', None)
+    if not _enabled or spans is None:
+        return None
+    record = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'thread': threading.current_thread().name,
+        'total_ms': (time.perf_counter() - _local.start) * 1000,
+        **fields,
+        'spans': get_spans(),
+    }
+    _local.spans = None
+    logger.info(json.dumps(record, default=str))
+    return record
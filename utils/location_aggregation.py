@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+# columns of the location table that is shown in the dashboards
+LOCATION_COLUMNS = ['Location', 'Address', 'Type', 'Category', 'Flair', 'Popularity', 'Number of Events']
+
+
+def rank_locations(location_codes: np.ndarray, names: np.ndarray, top_n: int = None, counts: np.ndarray = None) -> tuple:
+    """
+    Rank the locations by their number of events. Only the events are counted, and for top_n the locations are
+    not sorted completely but the top_n are selected with np.partition. Locations with the same number of events
+    are ordered by name, so the ranking does not depend on the order of the events.
+    :param location_codes: code of the location of every event as returned by pd.factorize, -1 for no location
+    :param names: name of the location of every code
+    :param top_n: only return the top_n locations with the most events, None to return all locations
+    :param counts: number of events of every code, None if every code is one event
+    :return: codes of the ranked locations, the location with the most events first, and their number of events
+    """
+    has_location = location_codes >= 0
+    weights = counts[has_location] if counts is not None else None
+    counts = np.bincount(location_codes[has_location], weights=weights, minlength=len(names)).astype(np.int64)
+    candidates = np.arange(len(names))
+    if top_n is not None and top_n < len(names):
+        # only locations with at least as many events as the top_n-th location can be in the top_n,
+        # the ties at this threshold are resolved by the name
+        kth = len(names) - top_n
+        candidates = np.flatnonzero(counts >= np.partition(counts, kth)[kth])
+    ranking = pd.Series(counts[candidates], index=candidates)
+    ranking = ranking.iloc[np.argsort(np.asarray(names, dtype=object)[candidates], kind='stable')]
+    ranking = ranking.sort_values(ascending=False, kind='stable')
+    if top_n is not None:
+        ranking = ranking.iloc[:top_n]
+    return ranking.index.to_numpy(), ranking.to_numpy()
+
+
+def most_common_values(location_ids: np.ndarray, values: pd.Series, counts: np.ndarray = None) -> np.ndarray:
+    """
+    Find the most common value for each location. Like statistics.mode, ties are broken by the value that
+    occurs first.
+    :param location_ids: location of every event as number from 0
+    :param values: value of every event, missing values are counted as well
+    :param counts: number of events of every value, None if every value is one event
+    :return: array with the most common value of every location, ordered by the location number
+    """
+    value_codes, unique_values = pd.factorize(values, use_na_sentinel=False)
+    pairs, first_positions, pair_ids = np.unique(location_ids * len(unique_values) + value_codes, return_index=True, return_inverse=True)
+    counts = np.bincount(pair_ids.ravel(), weights=counts)
+    pair_locations = pairs // len(unique_values)
+    # per location the most frequent value first, equal counts in the order of the first occurrence
+    order = np.lexsort((first_positions, -counts, pair_locations))
+    first_of_location = np.flatnonzero(np.r_[True, np.diff(pair_locations[order]) != 0])
+    return np.asarray(unique_values, dtype=object)[value_codes[first_positions[order[first_of_location]]]]
+
+
+def aggregate_locations(sub_df: pd.DataFrame, top_n: int = None, counts: np.ndarray = None, offset: int = 0) -> pd.DataFrame:
+    """
+    Aggregate the selected events per location. For each location the address of its first event, the number
+    of events and the most common Type, Category and Flair are determined.
+    :param sub_df: dataframe with the columns Location, Address, Type, Category and Flair
+    :param top_n: only return the top_n locations with the most events, None to return all locations
+    :param counts: number of events of every row if the rows are already counted events like the venue facet
+        counts, in the order of the first event of the rows. None if every row is one event
+    :param offset: number of ranked locations that are skipped, e.g. for the pages of a table
+    :return: dataframe with the columns of LOCATION_COLUMNS, sorted by the number of events and then by location
+    """
+    location_codes, names = pd.factorize(sub_df['Location'])
+    ranked_codes, num_of_events = rank_locations(location_codes, names, top_n=None if top_n is None else offset + top_n, counts=counts)
+    ranked_codes, num_of_events = ranked_codes[offset:], num_of_events[offset:]
+    if len(ranked_codes) == 0:
+        return pd.DataFrame(columns=LOCATION_COLUMNS[:-1])
+
+    # the address and the most common values are only determined for the events of the ranked locations
+    # events without location have the code -1 and get the rank -1 of the last element
+    ranks = np.full(len(names) + 1, -1)
+    ranks[ranked_codes] = np.arange(len(ranked_codes))
+    event_ranks = ranks[location_codes]
+    rows = np.flatnonzero(event_ranks >= 0)
+    location_ids = event_ranks[rows]
+    row_counts = counts[rows] if counts is not None else None
+    first_rows = rows[np.unique(location_ids, return_index=True)[1]]
+
+    location_df = pd.DataFrame({
+        'Location': np.asarray(names, dtype=object)[ranked_codes],
+        'Address': sub_df['Address'].to_numpy(dtype=object)[first_rows],
+        'Type': most_common_values(location_ids, sub_df['Type'].take(rows), row_counts),
+        'Category': most_common_values(location_ids, sub_df['Category'].take(rows), row_counts),
+        'Flair': most_common_values(location_ids, sub_df['Flair'].take(rows), row_counts),
+        # one star per event, but at most 5 stars
+        'Popularity': pd.Series('⭐', index=range(len(ranked_codes))).str.repeat(np.minimum(num_of_events, 5)),
+        'Number of Events': num_of_events,
+    })
+    return location_df
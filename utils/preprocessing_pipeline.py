@@ -0,0 +1,283 @@
+# Staged version of the preprocessing of the step-by-step-walkthrough notebook.
+# The output of every stage is checkpointed to disk together with a fingerprint of the input file, the stage
+# code (with the functions of utils it calls) and its parameters. A rerun resumes from the last checkpoint that
+# is still valid, so changing a late stage does not require parsing the json file again.
+#
+# The last stage labels the events with the stimmung of the topic model that the notebook saved, see utils/topic_model.
+# The venue facet counts of utils/venue_profiles are written next to the event store and the word cloud of
+# utils/word_frequencies is cached for it.
+#
+# Usage: python -m utils.preprocessing_pipeline stuttgart_events.json --output data/all_events_dashboard.parquet \
+#            --topic-model models/stimmung_topic_model.pkl
+
+import argparse
+import hashlib
+import inspect
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+from utils.atomic_write import write_atomically, write_json_atomically
+from utils.data_extraction import extract_json_data_into_dataframe, split_json_into_shards, parse_shards_in_parallel
+from utils.data_preprocessing import (is_event_in_stuttgart, is_event_not_cancelled, remove_event_data_prefix,
+                                      remove_sparse_columns, keep_wednesdays, add_district, extract_categories,
+                                      save_event_store)
+from utils.dataset_loader import compute_file_hash
+from utils.feature_engineering import add_time_features
+from utils.topic_model import load_topic_model, predict_stimmung
+from utils.venue_profiles import save_venue_facet_counts
+from utils.word_frequencies import build_word_cloud_cache
+
+logger = logging.getLogger(__name__)
+
+
+def parse_stage(df: pd.DataFrame, json_file_path: str, no_of_entries: int = None, n_jobs: int = 1, shard_dir: str = None) -> pd.DataFrame:
+    # flatten the nested json structure of the events, only events in Stuttgart that were not cancelled
+    # are kept and they are already dropped while the json file is parsed. The Wednesdays are not filtered here
+    # with is_event_on_wednesday but in the wednesdays stage, because sparse_columns_stage drops the columns by
+    # their share of missing values among all events, a smaller row set would keep different columns
+    predicates = [is_event_not_cancelled, is_event_in_stuttgart]
+    if n_jobs == 1:
+        return extract_json_data_into_dataframe(json_file_path, no_of_entries, predicates=predicates)
+    # find the byte ranges of the shards once and parse the shards in parallel
+    shards = split_json_into_shards(json_file_path, shard_dir or f'{json_file_path}.shards', no_of_entries=no_of_entries)
+    return parse_shards_in_parallel(shards, predicates=predicates, n_jobs=n_jobs)
+
+
+def clean_stage(df: pd.DataFrame) -> pd.DataFrame:
+    return remove_event_data_prefix(df)
+
+
+def sparse_columns_stage(df: pd.DataFrame) -> pd.DataFrame:
+    # drop columns with more than 80% missing values
+    return remove_sparse_columns(df, max_missing_ratio=0.8)
+
+
+def wednesday_stage(df: pd.DataFrame) -> pd.DataFrame:
+    return keep_wednesdays(df)
+
+
+def sample_stage(df: pd.DataFrame, sample_size: int = None) -> pd.DataFrame:
+    # sample the data to reduce the number of events, e.g. only select 2000 events
+    if sample_size is None or sample_size >= len(df):
+        return df
+    return df.sample(n=sample_size, random_state=42).reset_index(drop=True)
+
+
+def time_features_stage(df: pd.DataFrame) -> pd.DataFrame:
+    # vectorized year, month, starting_hour, season and time_of_day
+    return add_time_features(df)
+
+
+def district_stage(df: pd.DataFrame) -> pd.DataFrame:
+    return add_district(df)
+
+
+def categories_stage(df: pd.DataFrame) -> pd.DataFrame:
+    return extract_categories(df)
+
+
+def stimmung_stage(df: pd.DataFrame, topic_model_path: str = None, n_jobs: int = None) -> pd.DataFrame:
+    # label the events with the saved topic model, the dashboards filter by the stimmung.
+    # Without a topic model the events are not labeled and cannot be saved as event store of the dashboards
+    if topic_model_path is None:
+        return df
+    df = df.copy()
+    df['stimmung'] = predict_stimmung(load_topic_model(topic_model_path), df['description'], n_jobs=n_jobs)
+    return df
+
+
+# the stages in the order in which they are run
+STAGES = [
+    ('parse', parse_stage),
+    ('clean', clean_stage),
+    ('sparse_columns', sparse_columns_stage),
+    ('wednesdays', wednesday_stage),
+    ('sample', sample_stage),
+    ('time_features', time_features_stage),
+    ('district', district_stage),
+    ('categories', categories_stage),
+    ('stimmung', stimmung_stage),
+]
+
+
+def get_input_fingerprint(json_file_path: str) -> str:
+    """
+    Fingerprint of the json file that is cheap to compute: its absolute path, size and modification time
+    :param json_file_path: path to the json file
+    :return: fingerprint string
+    """
+    stat = os.stat(json_file_path)
+    return f'{os.path.abspath(json_file_path)}:{stat.st_size}:{stat.st_mtime_ns}'
+
+
+# directory of the repository, only the code in it is part of the stage fingerprints
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# module level values of these types that the stage code uses are part of the fingerprint, e.g. zip_code_to_district
+CONSTANT_TYPES = (str, int, float, bool, tuple, list, dict, np.ndarray)
+# parameters that only change how a stage is run, not its output, they are not part of the fingerprint
+EXECUTION_PARAMS = {'n_jobs', 'shard_dir'}
+
+
+def _get_code_names(code) -> set:
+    # names used by the code and by its nested code like lambdas and comprehensions
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _get_code_names(const)
+    return names
+
+
+def get_code_fingerprint(function) -> str:
+    """
+    Collect the source of a function and of all functions and constants of the repository that it uses,
+    directly or through other functions. A change in e.g. add_time_features changes the fingerprint of
+    time_features_stage, although the stage only calls it.
+    :param function: the stage function
+    :return: the sources and constants sorted by file and name
+    """
+    parts = {}
+    pending = [function]
+    while pending:
+        function = pending.pop()
+        code = function.__code__
+        key = f'{os.path.relpath(code.co_filename, REPOSITORY_DIR)}:{function.__qualname__}'
+        if key in parts:
+            continue
+        parts[key] = inspect.getsource(function)
+        for name in sorted(_get_code_names(code)):
+            value = function.__globals__.get(name)
+            if inspect.isfunction(value) and os.path.abspath(value.__code__.co_filename).startswith(REPOSITORY_DIR + os.sep):
+                pending.append(value)
+            elif isinstance(value, CONSTANT_TYPES) and not inspect.ismodule(value):
+                parts[f'{os.path.relpath(code.co_filename, REPOSITORY_DIR)}:{name}'] = repr(value)
+    return '\n'.join(parts[key] for key in sorted(parts))
+
+
+def get_stage_fingerprint(previous_fingerprint: str, name: str, stage, params: dict) -> str:
+    """
+    Fingerprint of a stage output. It changes when the input of the stage, the code of the stage (including the
+    functions it calls, see get_code_fingerprint), its parameters or the files of its *_path parameters change.
+    The EXECUTION_PARAMS like the number of processes do not change it.
+    :param previous_fingerprint: fingerprint of the output of the previous stage or of the input file
+    :param name: name of the stage
+    :param stage: the stage function
+    :param params: parameters the stage is called with
+    :return: hex digest
+    """
+    stage_hash = hashlib.sha256()
+    stage_hash.update(previous_fingerprint.encode())
+    stage_hash.update(name.encode())
+    stage_hash.update(get_code_fingerprint(stage).encode())
+    # a changed file like the topic model changes the fingerprint as well
+    params = {key: get_input_fingerprint(value) if key.endswith('_path') and isinstance(value, str) and os.path.isfile(value) else value
+              for key, value in params.items() if key not in EXECUTION_PARAMS}
+    stage_hash.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return stage_hash.hexdigest()
+
+
+def _checkpoint_path(checkpoint_dir: str, position: int, name: str) -> str:
+    return os.path.join(checkpoint_dir, f'{position:02d}_{name}.pkl')
+
+
+def _read_manifest(checkpoint_dir: str) -> dict:
+    manifest_path = os.path.join(checkpoint_dir, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _write_manifest(checkpoint_dir: str, manifest: dict):
+    write_json_atomically(os.path.join(checkpoint_dir, 'manifest.json'), manifest, indent=2)
+
+
+def run_pipeline(json_file_path: str, checkpoint_dir: str = 'checkpoints', stage_params: dict = None, rerun_from: str = None) -> tuple:
+    """
+    Run all stages of the preprocessing, starting after the last valid checkpoint
+    :param json_file_path: path to the json file with the events
+    :param checkpoint_dir: directory where the output of every stage is stored
+    :param stage_params: dictionary with a stage name as key and the keyword arguments of that stage as value
+    :param rerun_from: name of a stage that should be run again even if its checkpoint is valid
+    :return: dataframe containing the preprocessed events and the names of the stages that were run,
+        an empty list if the checkpoint of the last stage was valid
+    """
+    stage_params = dict(stage_params or {})
+    stage_params.setdefault('parse', {})['json_file_path'] = json_file_path
+    stage_names = [name for name, _ in STAGES]
+    if rerun_from is not None and rerun_from not in stage_names:
+        raise ValueError(f'Unknown stage {rerun_from}, the stages are {", ".join(stage_names)}')
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    manifest = _read_manifest(checkpoint_dir)
+
+    # compute the fingerprints of all stages and find the last stage whose checkpoint is valid
+    fingerprints = []
+    fingerprint = get_input_fingerprint(json_file_path)
+    for name, stage in STAGES:
+        fingerprint = get_stage_fingerprint(fingerprint, name, stage, stage_params.get(name, {}))
+        fingerprints.append(fingerprint)
+    last_valid = -1
+    for position, (name, _) in enumerate(STAGES):
+        if name == rerun_from:
+            break
+        if manifest.get(name) != fingerprints[position] or not os.path.exists(_checkpoint_path(checkpoint_dir, position, name)):
+            break
+        last_valid = position
+
+    df = None
+    ran_stages = []
+    if last_valid >= 0:
+        name = STAGES[last_valid][0]
+        logger.info('Resuming after stage %s', name)
+        df = pd.read_pickle(_checkpoint_path(checkpoint_dir, last_valid, name))
+    for position in range(last_valid + 1, len(STAGES)):
+        name, stage = STAGES[position]
+        df = stage(df, **stage_params.get(name, {}))
+        write_atomically(_checkpoint_path(checkpoint_dir, position, name), df.to_pickle)
+        manifest[name] = fingerprints[position]
+        # stages after this one have to run again
+        for later_name in stage_names[position + 1:]:
+            manifest.pop(later_name, None)
+        _write_manifest(checkpoint_dir, manifest)
+        logger.info('Stage %s done, shape %s', name, df.shape)
+        ran_stages.append(name)
+    return df, ran_stages
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Preprocess the events of stuttgart_events.json for the dashboards')
+    parser.add_argument('json_file', help='path to stuttgart_events.json')
+    parser.add_argument('--output', default='data/all_events_dashboard.parquet', help='path of the parquet event store that is written')
+    parser.add_argument('--checkpoint-dir', default='checkpoints', help='directory for the stage checkpoints')
+    parser.add_argument('--num-events', type=int, default=None, help='only parse the first events of the json file')
+    parser.add_argument('--jobs', type=int, default=1, help='split the json file into shards and parse them with this many processes, also used to tokenize the descriptions of the word cloud')
+    parser.add_argument('--shard-dir', default=None, help='directory for the manifest of the json shards, default is next to the json file')
+    parser.add_argument('--sample', type=int, default=None, help='sample this many Wednesday events, e.g. 2000')
+    parser.add_argument('--topic-model', default='models/stimmung_topic_model.pkl', help='topic model saved by the notebook that labels the stimmung')
+    parser.add_argument('--rerun-from', choices=[name for name, _ in STAGES], default=None, help='run this and all later stages again')
+    args = parser.parse_args()
+    # the dashboards need the stimmung, so no event store is written without it
+    if not os.path.isfile(args.topic_model):
+        parser.error(f'The topic model {args.topic_model} does not exist, the step-by-step-walkthrough notebook saves it')
+
+    events_df, ran_stages = run_pipeline(
+        args.json_file,
+        checkpoint_dir=args.checkpoint_dir,
+        stage_params={
+            'parse': {'no_of_entries': args.num_events, 'n_jobs': args.jobs, 'shard_dir': args.shard_dir},
+            'sample': {'sample_size': args.sample},
+            'stimmung': {'topic_model_path': args.topic_model},
+        },
+        rerun_from=args.rerun_from,
+    )
+    # nothing was recomputed, the event store, its venue facet counts and word cloud are already up to date
+    if not ran_stages and os.path.isfile(args.output):
+        logger.info('All stages are up to date, %s is not written again', args.output)
+    else:
+        save_event_store(events_df, args.output)
+        store_hash = compute_file_hash(args.output)
+        save_venue_facet_counts(events_df, args.output, store_hash)
+        build_word_cloud_cache(args.output, store_hash, events_df['description'], n_jobs=args.jobs)
+        logger.info('Saved %s events to %s', len(events_df), args.output)
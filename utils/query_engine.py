@@ -0,0 +1,119 @@
+# The location query of the dashboards without streamlit. It is used by the dashboards themselves and by the
+# http service of utils/query_service, so the query work can run in separate processes.
+# The query is answered from the venue facet counts of utils/venue_profiles, which have one row per venue and
+# combination of the facets instead of one row per event.
+
+import os
+import pandas as pd
+
+from utils.data_preprocessing import resolve_event_store_path
+from utils.dataset_loader import load_dataset, get_dataset_info, get_dataset_artifact
+from utils.filter_index import build_filter_index, select_rows
+from utils.instrumentation import span
+from utils.location_aggregation import aggregate_locations
+from utils.venue_profiles import VENUE_COLUMN, ADDRESS_COLUMN, get_venue_facet_counts
+
+# columns of the event store that are needed to build the venue facet counts
+QUERY_COLUMNS = ['location.name', 'location.location.address.street', 'supercategory', 'subcategory', 'stimmung', 'season', 'district']
+
+
+def select_event_rows(filter_index: dict, event_type: list, location_sidebar: list, season: list, event_subtype: list, mood: list):
+    """
+    Look up the rows that match all selections in the filter index instead of scanning the dataframe
+    :param filter_index: the filter index created by build_filter_index
+    :param event_type: list of event types
+    :param location_sidebar: list of district names
+    :param season: list of seasons
+    :param event_subtype: list of event subtypes, events without subtype always match
+    :param mood: list of moods
+    :return: positions of the matching rows
+    """
+    return select_rows(filter_index, {
+        'season': season,
+        'district': location_sidebar,
+        'supercategory': event_type,
+        'subcategory': list(event_subtype) + [""],
+        'stimmung': mood,
+    })
+
+
+def load_venue_facet_counts(data_path: str, columns: list = QUERY_COLUMNS) -> tuple:
+    """
+    Load the venue facet counts of a dataset and their filter index once per dataset version
+    :param data_path: path of the event store
+    :param columns: the columns that are passed to load_dataset
+    :return: the venue facet counts and the filter index of their facet columns
+    """
+    load_dataset(data_path, columns=columns)
+    dataset_hash = get_dataset_info(data_path, columns=columns)['hash']
+    venue_facet_counts = get_dataset_artifact(data_path, columns, 'venue_facet_counts', lambda df: get_venue_facet_counts(data_path, df, dataset_hash))
+    venue_facet_index = get_dataset_artifact(data_path, columns, 'venue_facet_index', lambda df: build_filter_index(venue_facet_counts))
+    return venue_facet_counts, venue_facet_index
+
+
+def find_locations(venue_facet_counts: pd.DataFrame, venue_facet_index: dict, event_type: list, location_sidebar: list, season: list, event_subtype: list, mood: list, top_n: int = None, offset: int = 0) -> pd.DataFrame:
+    """
+    Select the events that correspond to the user preferences and rank their locations by the number of events
+    :param venue_facet_counts: the venue facet counts created by build_venue_facet_counts
+    :param venue_facet_index: the filter index of the venue facet counts created by build_filter_index
+    :param event_type: list of event types
+    :param location_sidebar: list of district names that the user selected
+    :param season: list of seasons that the user selected
+    :param event_subtype: list of event subtypes that the user selected
+    :param mood: list of moods that the user selected
+    :param top_n: only return the top_n locations, None to return all locations
+    :param offset: number of ranked locations that are skipped, e.g. for the pages of the all locations table
+    :return: dataframe with one row per location, see aggregate_locations
+    """
+    with span('select_rows'):
+        selected_rows = select_event_rows(venue_facet_index, event_type, location_sidebar, season, event_subtype, mood)
+    sub_df = venue_facet_counts.iloc[selected_rows]
+    # Only select the relevant columns
+    counts = sub_df['count'].to_numpy()
+    sub_df = sub_df[[VENUE_COLUMN, ADDRESS_COLUMN, 'supercategory', 'subcategory', 'stimmung']]
+    sub_df.columns = ['Location', 'Address', 'Type', 'Category', 'Flair']
+    # count the events per location and find the most common flair, type and category for each location
+    with span('aggregate_locations'):
+        return aggregate_locations(sub_df, top_n=top_n, counts=counts, offset=offset)
+
+
+def count_locations(venue_facet_counts: pd.DataFrame, venue_facet_index: dict, event_type: list, location_sidebar: list, season: list, event_subtype: list, mood: list) -> int:
+    """
+    :return: number of locations that find_locations returns without top_n, see find_locations for the parameters
+    """
+    selected_rows = select_event_rows(venue_facet_index, event_type, location_sidebar, season, event_subtype, mood)
+    return int(venue_facet_counts[VENUE_COLUMN].iloc[selected_rows].nunique())
+
+
+def get_dataset_path(data_dir: str, dataset: str) -> str:
+    """
+    :param data_dir: directory with the event stores
+    :param dataset: name of the dataset, e.g. all_events_dashboard or 2000_events_sample
+    :return: path of the parquet event store, or of the csv file if it was not converted yet
+    """
+    if not dataset or os.path.basename(dataset) != dataset or dataset.startswith('.'):
+        raise ValueError(f'Invalid dataset name {dataset!r}')
+    path = resolve_event_store_path(os.path.join(data_dir, f'{dataset}.csv'))
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'Dataset {dataset} does not exist in {data_dir}')
+    return path
+
+
+def query_locations(data_path: str, event_type: list, location_sidebar: list, season: list, event_subtype: list, mood: list, top_n: int = None, offset: int = 0) -> pd.DataFrame:
+    """
+    Answer a query on a dataset. The venue facet counts of the dataset are loaded once per process and shared
+    by all queries, like in the dashboards.
+    :param data_path: path of the event store
+    :return: dataframe with one row per location, see find_locations for the other parameters
+    """
+    venue_facet_counts, venue_facet_index = load_venue_facet_counts(data_path)
+    return find_locations(venue_facet_counts, venue_facet_index, event_type, location_sidebar, season, event_subtype, mood, top_n=top_n, offset=offset)
+
+
+def query_location_count(data_path: str, event_type: list, location_sidebar: list, season: list, event_subtype: list, mood: list) -> int:
+    """
+    :param data_path: path of the event store
+    :return: number of locations of the query, see find_locations for the other parameters
+    """
+    venue_facet_counts, venue_facet_index = load_venue_facet_counts(data_path)
+    return count_locations(venue_facet_counts, venue_facet_index, event_type, location_sidebar, season, event_subtype, mood)
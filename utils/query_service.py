@@ -0,0 +1,205 @@
+# Small http api for the location query of utils/query_engine, it only needs the standard library.
+# The datasets are loaded once per process and the requests are answered by a pool of worker threads.
+#
+# Usage: python -m utils.query_service --data-dir data --port 8502
+#   curl 'localhost:8502/locations?dataset=2000_events_sample&event_type=bar&event_type=party&top_n=5'
+#   curl -X POST localhost:8502/locations -d '{"dataset": "2000_events_sample", "event_type": ["bar"], "top_n": 5}'
+#   curl -X POST localhost:8502/count -d '{"dataset": "2000_events_sample", "event_type": ["bar"]}'
+# The dashboards use the service instead of answering the query themselves when QUERY_SERVICE_URL is set,
+# e.g. QUERY_SERVICE_URL=http://localhost:8502 streamlit run dashboard_demo.py
+
+import argparse
+import json
+import logging
+import os
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+
+from utils.query_engine import get_dataset_path, query_locations, query_location_count
+
+logger = logging.getLogger(__name__)
+
+# names of the preferences in the api and the corresponding parameters of query_locations
+PREFERENCES = {
+    'event_type': 'event_type',
+    'districts': 'location_sidebar',
+    'seasons': 'season',
+    'subtypes': 'event_subtype',
+    'moods': 'mood',
+}
+# paths of the api: the ranked locations and the number of locations of a query
+QUERIES = ['/locations', '/count']
+
+
+def parse_query(params: dict) -> dict:
+    """
+    :param params: request parameters, the preferences are lists of strings
+    :return: keyword arguments of query_locations and the name of the dataset
+    """
+    query = {}
+    for name, parameter in PREFERENCES.items():
+        values = params.get(name, [])
+        if isinstance(values, str) or not all(isinstance(value, str) for value in values):
+            raise ValueError(f'{name} must be a list of strings')
+        query[parameter] = list(values)
+    top_n = params.get('top_n')
+    if top_n is not None:
+        top_n = int(top_n)
+        if top_n < 1:
+            raise ValueError('top_n must be at least 1')
+    query['top_n'] = top_n
+    query['offset'] = int(params.get('offset', 0))
+    if query['offset'] < 0:
+        raise ValueError('offset must not be negative')
+    query['dataset'] = params.get('dataset')
+    return query
+
+
+def locations_to_json(locations_df: pd.DataFrame) -> dict:
+    """
+    :param locations_df: dataframe returned by query_locations
+    :return: dictionary with the column names and the locations as list of records, missing values are null
+    """
+    records = locations_df.astype(object).where(locations_df.notna(), None).to_dict('records')
+    return {'columns': locations_df.columns.tolist(), 'locations': records}
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif url.path in QUERIES:
+            params = parse_qs(url.query)
+            # single valued parameters
+            for name in ['dataset', 'top_n', 'offset']:
+                if name in params:
+                    params[name] = params[name][0]
+            self._answer_query(url.path, params)
+        else:
+            self._send_json(404, {'error': f'Unknown path {url.path}'})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path not in QUERIES:
+            self._send_json(404, {'error': f'Unknown path {path}'})
+            return
+        try:
+            params = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if not isinstance(params, dict):
+                raise ValueError('The body must be a json object')
+        except ValueError as error:
+            self._send_json(400, {'error': str(error)})
+            return
+        self._answer_query(path, params)
+
+    def _answer_query(self, path: str, params: dict):
+        try:
+            query = parse_query(params)
+            data_path = get_dataset_path(self.server.data_dir, query.pop('dataset') or self.server.default_dataset)
+        except (TypeError, ValueError) as error:
+            self._send_json(400, {'error': str(error)})
+            return
+        except FileNotFoundError as error:
+            self._send_json(404, {'error': str(error)})
+            return
+        if path == '/count':
+            del query['top_n'], query['offset']
+            self._send_json(200, {'num_locations': query_location_count(data_path, **query)})
+        else:
+            self._send_json(200, locations_to_json(query_locations(data_path, **query)))
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info('%s %s', self.address_string(), format % args)
+
+
+class QueryServer(HTTPServer):
+    """
+    HTTP server that answers the requests with a fixed number of worker threads
+    """
+    def __init__(self, server_address, data_dir: str, default_dataset: str = 'all_events_dashboard', workers: int = 8):
+        super().__init__(server_address, QueryRequestHandler)
+        self.data_dir = data_dir
+        self.default_dataset = default_dataset
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def _post_query(service_url: str, path: str, query: dict, timeout: float) -> dict:
+    request = urllib.request.Request(f'{service_url.rstrip("/")}{path}', data=json.dumps(query).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+
+def _get_preferences(event_type: list, location_sidebar: list, season: list, event_subtype: list, mood: list) -> dict:
+    return {name: list(values) for name, values in zip(PREFERENCES, [event_type, location_sidebar, season, event_subtype, mood])}
+
+
+def fetch_locations(service_url: str, dataset: str, event_type: list, location_sidebar: list, season: list, event_subtype: list, mood: list, top_n: int = None, offset: int = 0, timeout: float = 30) -> pd.DataFrame:
+    """
+    Client of the service for the dashboards, it takes the same parameters as query_locations
+    :param service_url: url of the service, e.g. http://localhost:8502
+    :param dataset: name of the dataset, e.g. 2000_events_sample
+    :param timeout: timeout of the request in seconds
+    :return: dataframe with one row per location
+    """
+    query = {'dataset': dataset, 'top_n': top_n, 'offset': offset, **_get_preferences(event_type, location_sidebar, season, event_subtype, mood)}
+    result = _post_query(service_url, '/locations', query, timeout)
+    return pd.DataFrame.from_records(result['locations'], columns=result['columns'])
+
+
+def fetch_location_count(service_url: str, dataset: str, event_type: list, location_sidebar: list, season: list, event_subtype: list, mood: list, timeout: float = 30) -> int:
+    """
+    Client of the service for the dashboards, see fetch_locations for the parameters
+    :return: number of locations of the query
+    """
+    query = {'dataset': dataset, **_get_preferences(event_type, location_sidebar, season, event_subtype, mood)}
+    return _post_query(service_url, '/count', query, timeout)['num_locations']
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='HTTP api for the location query of the dashboards')
+    parser.add_argument('--data-dir', default='data', help='directory with the event stores')
+    parser.add_argument('--dataset', default='all_events_dashboard', help='dataset that is used when a request does not name one')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='number of worker threads')
+    args = parser.parse_args()
+
+    # load the default dataset before the first request
+    query_locations(get_dataset_path(args.data_dir, args.dataset), [], [], [], [], [])
+    server = QueryServer((args.host, args.port), args.data_dir, args.dataset, args.workers)
+    logger.info('Serving on http://%s:%s with %s workers', args.host, args.port, args.workers)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,73 @@
+# Cache for the rendered location tables of the dashboards.
+# Many sessions use the same sidebar selections (most of them the defaults), so the rendered html of a
+# selection is kept and served again instead of filtering, aggregating and rendering it on every rerun.
+
+import threading
+from collections import OrderedDict
+
+
+def normalize_preferences(selected_tab: str, event_type: list, location_sidebar: list, season: list, event_subtype: list, mood: list) -> tuple:
+    """
+    Turn the user preferences into a hashable key that does not depend on the order of the selections
+    :param selected_tab: the selected tab of the dashboard
+    :param event_type: list of event types
+    :param location_sidebar: list of district names that the user selected
+    :param season: list of seasons that the user selected
+    :param event_subtype: list of event subtypes that the user selected
+    :param mood: list of moods that the user selected
+    :return: tuple of the tab and the sorted selections
+    """
+    return (
+        tuple(sorted(set(event_type))),
+        tuple(sorted(set(location_sidebar))),
+        tuple(sorted(set(season))),
+        tuple(sorted(set(event_subtype))),
+        tuple(sorted(set(mood))),
+        selected_tab,
+    )
+
+
+class ResultCache:
+    """
+    Least recently used cache of rendered results for one version of a dataset. It is bounded by the number
+    of entries and by the total length of the cached strings, create a new one when the dataset changes.
+    """
+
+    def __init__(self, max_entries: int = 256, max_chars: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key: tuple, render) -> str:
+        """
+        Return the cached result of the key or render and cache it
+        :param key: key created by normalize_preferences
+        :param render: function without arguments that returns the rendered result as a string
+        :return: the rendered result
+        """
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+            self.misses += 1
+        result = render()
+        with self._lock:
+            if key not in self._results and len(result) <= self.max_chars:
+                self._results[key] = result
+                self._chars += len(result)
+                while len(self._results) > self.max_entries or self._chars > self.max_chars:
+                    _, evicted = self._results.popitem(last=False)
+                    self._chars -= len(evicted)
+        return result
+
+    def stats(self) -> dict:
+        """
+        :return: dictionary with the number of hits, misses, cached entries and cached characters
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._results), 'chars': self._chars}
@@ -0,0 +1,87 @@
+# Spatial index for the coordinate map of the dashboards.
+# Events at the same venue (same location name and coordinate) are merged into one point and the venues are
+# assigned to the cells of uniform grids of several resolutions. For a selection of events the map only gets
+# one point per venue, or one point per grid cell of the finest grid that keeps the number of points small.
+
+import numpy as np
+import pandas as pd
+
+LATITUDE_COLUMN = 'location.location.coordinate.lat'
+LONGITUDE_COLUMN = 'location.location.coordinate.lon'
+LOCATION_NAME_COLUMN = 'location.name'
+# height of the grid cells in degrees latitude, from about 22 km down to about 40 m
+GRID_CELL_SIZES = [0.2 / 2 ** level for level in range(10)]
+
+
+def build_spatial_index(df: pd.DataFrame) -> dict:
+    """
+    Merge the events of every venue and assign the venues to the grid cells of every resolution
+    :param df: dataframe containing the events with location name and coordinates
+    :return: dictionary with the venue of every event (-1 for events without coordinates), the coordinates and
+        names of the venues and the grid cell of every venue per resolution
+    """
+    latitudes = df[LATITUDE_COLUMN].to_numpy(dtype=np.float64, na_value=np.nan)
+    longitudes = df[LONGITUDE_COLUMN].to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = ~(np.isnan(latitudes) | np.isnan(longitudes))
+    venues = pd.DataFrame({
+        'name': df[LOCATION_NAME_COLUMN].to_numpy(dtype=object)[valid],
+        'latitude': latitudes[valid],
+        'longitude': longitudes[valid],
+    })
+    venue_ids = np.full(len(df), -1, dtype=np.int32)
+    # venues are numbered in the order of their first event, like drop_duplicates keeps them
+    venue_ids[valid] = venues.groupby(['name', 'latitude', 'longitude'], sort=False, dropna=False).ngroup().to_numpy()
+    venues = venues.drop_duplicates(ignore_index=True)
+
+    # a degree of longitude is shorter than a degree of latitude, the cells should be about square
+    longitude_scale = np.cos(np.radians(venues['latitude'].mean())) if len(venues) else 1.0
+    cell_ids = []
+    for cell_size in GRID_CELL_SIZES:
+        rows = np.floor(venues['latitude'].to_numpy() / cell_size).astype(np.int64)
+        columns = np.floor(venues['longitude'].to_numpy() * longitude_scale / cell_size).astype(np.int64)
+        cell_ids.append(pd.factorize(pd.MultiIndex.from_arrays([rows, columns]))[0].astype(np.int32))
+    return {
+        'venue_ids': venue_ids,
+        'latitude': venues['latitude'].to_numpy(),
+        'longitude': venues['longitude'].to_numpy(),
+        'names': venues['name'].to_numpy(),
+        'cell_ids': cell_ids,
+    }
+
+
+def cluster_points(spatial_index: dict, rows: np.ndarray = None, max_points: int = 1000) -> pd.DataFrame:
+    """
+    Return the points of the selected events for the map. Every venue is one point if there are at most
+    max_points venues, otherwise the venues are clustered with the finest grid that has at most max_points
+    non-empty cells.
+    :param spatial_index: index created by build_spatial_index
+    :param rows: positions of the selected events, None to select all events
+    :param max_points: maximal number of points
+    :return: dataframe with the columns latitude, longitude, count (number of events) and venues (number of venues),
+        the point with the most events first
+    """
+    venue_ids = spatial_index['venue_ids'] if rows is None else spatial_index['venue_ids'][rows]
+    venue_counts = np.bincount(venue_ids[venue_ids >= 0], minlength=len(spatial_index['names']))
+    present = np.flatnonzero(venue_counts)
+    counts = venue_counts[present]
+    latitudes = spatial_index['latitude'][present]
+    longitudes = spatial_index['longitude'][present]
+    if len(present) <= max_points:
+        points = pd.DataFrame({'latitude': latitudes, 'longitude': longitudes, 'count': counts, 'venues': 1})
+    else:
+        # the grids are ordered from coarse to fine, use the finest one that is small enough
+        cells = spatial_index['cell_ids'][0][present]
+        for cell_ids in spatial_index['cell_ids'][1:]:
+            if len(np.unique(cell_ids[present])) > max_points:
+                break
+            cells = cell_ids[present]
+        cells, cell_index = np.unique(cells, return_inverse=True)
+        cell_counts = np.bincount(cell_index, weights=counts)
+        # the point of a cluster is the center of its events
+        points = pd.DataFrame({
+            'latitude': np.bincount(cell_index, weights=counts * latitudes) / cell_counts,
+            'longitude': np.bincount(cell_index, weights=counts * longitudes) / cell_counts,
+            'count': cell_counts.astype(np.int64),
+            'venues': np.bincount(cell_index),
+        })
+    return points.sort_values('count', ascending=False, kind='stable', ignore_index=True)
@@ -0,0 +1,55 @@
+# Pre-aggregated event counts for the charts of the "Information about subset of dataset" tab.
+# The cube holds the number of events of every combination of the dimensions. It is built once per dataset
+# version, the charts sum the cube instead of counting the values of all events on every rerun.
+
+import numpy as np
+import pandas as pd
+
+CUBE_DIMENSIONS = ['supercategory', 'subcategory', 'month', 'starting_hour', 'time_of_day', 'season', 'district']
+
+
+def build_summary_cube(df: pd.DataFrame, dimensions: list = CUBE_DIMENSIONS) -> pd.DataFrame:
+    """
+    Count the events of every combination of the dimensions that occurs in the data
+    :param df: dataframe containing the events
+    :param dimensions: columns that can be counted and filtered
+    :return: dataframe with the dimensions, the number of events (count) and the position of the first event
+        of the combination (first_row), which is needed to order equal counts like value_counts does
+    """
+    positions = pd.Series(np.arange(len(df), dtype=np.int32), index=df.index)
+    grouped = positions.groupby([df[dimension] for dimension in dimensions], dropna=False, observed=True, sort=False)
+    cube = grouped.agg(['size', 'min']).reset_index()
+    cube = cube.rename(columns={'size': 'count', 'min': 'first_row'})
+    cube['count'] = cube['count'].astype(np.int32)
+    cube['first_row'] = cube['first_row'].astype(np.int32)
+    return cube.sort_values('first_row', ignore_index=True)
+
+
+def count_values(summary_cube: pd.DataFrame, column: str, filters: dict = None) -> pd.Series:
+    """
+    The same as df[column].value_counts() for the events that match the filters, computed from the cube
+    :param summary_cube: cube created by build_summary_cube
+    :param column: dimension that is counted
+    :param filters: dictionary with a dimension as key and the value that the events must have as value
+    :return: series with the values as index and the number of events as values, the most frequent value first
+    """
+    cube = summary_cube
+    for filter_column, value in (filters or {}).items():
+        cube = cube[cube[filter_column] == value]
+    if isinstance(cube[column].dtype, pd.CategoricalDtype):
+        # like value_counts, categorical columns also count the categories without events
+        counts = cube.groupby(column, observed=False)['count'].sum()
+    else:
+        # the cube is ordered by first_row, so the values are in the order of their first occurrence
+        counts = cube.groupby(column, sort=False)['count'].sum()
+    counts = counts.astype(np.int64).rename('count')
+    return counts.sort_values(ascending=False, kind='stable')
+
+
+def get_unique_values(summary_cube: pd.DataFrame, column: str) -> np.ndarray:
+    """
+    :param summary_cube: cube created by build_summary_cube
+    :param column: dimension
+    :return: the values of the dimension in the order of their first occurrence, like df[column].unique()
+    """
+    return summary_cube[column].drop_duplicates().to_numpy()
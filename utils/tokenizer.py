@@ -0,0 +1,111 @@
+# Tokenizer for the event descriptions that is shared by the word cloud and the topic model.
+# A description is cleaned from html tags, entities and links, lowercased and split into words with one
+# compiled regular expression, stopwords are removed in the same pass. The topic model keeps the html, so its
+# tokens are the ones of the CountVectorizer that the saved model was fitted with. Large collections of
+# descriptions are tokenized in chunks on a process pool.
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+STOPWORDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stopwords')
+# tokens that are left over from html and links in the descriptions
+WORD_CLOUD_CUSTOM_STOPWORDS = {"br", "href", "s", "u", "S", "https", "de", "nofollow", "rel"}
+# the stopwords of the topic model fit in the notebook, including the '1819' of its list where a comma between
+# '18' and '19' is missing, so the saved topic model gets the tokens it was fitted on
+TOPIC_MODEL_CUSTOM_STOPWORDS = {'stuttgart', 'de', 'www', 'uhr', '00', '30', '01', '02', '03', '04', '05', '06', '07', '08', '09', '10', '11', '12', '13', '14', '15', '16', '17', '1819', '20', '21', '22', '23', '1', 'http', 'com', 'br', 'https', '2020', '2021', '2022', '2023'}
+
+HTML_PATTERN = re.compile(r'<[^>]*>|&#?\w+;|(?:https?://|www\.)\S+')
+# words of at least two characters, the default token pattern of sklearn's CountVectorizer
+TOKEN_PATTERN = re.compile(r'(?u)\b\w\w+\b')
+
+
+def load_stopwords(language: str) -> set:
+    """
+    Load the bundled stopword list of a language (the lists of the nltk stopwords corpus)
+    :param language: 'german' or 'english'
+    :return: set of stopwords
+    """
+    with open(os.path.join(STOPWORDS_DIR, f'{language}.txt'), encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def get_word_cloud_stopwords() -> frozenset:
+    """
+    :return: lowercase stopwords that are removed before the word cloud is created
+    """
+    from wordcloud import STOPWORDS
+    stopwords = load_stopwords('german') | WORD_CLOUD_CUSTOM_STOPWORDS | set(STOPWORDS)
+    return frozenset(word.lower() for word in stopwords)
+
+
+def get_topic_model_stopwords() -> frozenset:
+    """
+    :return: lowercase stopwords that are removed before the topic model is fitted
+    """
+    stopwords = load_stopwords('german') | load_stopwords('english') | TOPIC_MODEL_CUSTOM_STOPWORDS
+    return frozenset(word.lower() for word in stopwords)
+
+
+def strip_html(text: str) -> str:
+    """
+    Replace html tags, html entities and links by spaces
+    :param text: text of a description
+    :return: text without html artifacts
+    """
+    return HTML_PATTERN.sub(' ', text)
+
+
+def tokenize(text: str, stopwords: frozenset = frozenset(), remove_numbers: bool = False, remove_html: bool = True) -> list:
+    """
+    Split a description into lowercase words without html artifacts and stopwords
+    :param text: text of a description, anything that is not a string has no tokens
+    :param stopwords: lowercase stopwords that are removed
+    :param remove_numbers: whether tokens that only consist of digits are removed
+    :param remove_html: whether html tags, entities and links are removed first. Without it the tokens are the
+        ones of CountVectorizer with the default token pattern
+    :return: list of tokens
+    """
+    if not isinstance(text, str):
+        return []
+    tokens = TOKEN_PATTERN.findall((strip_html(text) if remove_html else text).lower())
+    if remove_numbers:
+        return [token for token in tokens if token not in stopwords and not token.isdigit()]
+    return [token for token in tokens if token not in stopwords]
+
+
+def _tokenize_chunk(texts: list, stopwords: frozenset, remove_numbers: bool, remove_html: bool) -> list:
+    return [tokenize(text, stopwords, remove_numbers, remove_html) for text in texts]
+
+
+def tokenize_documents(texts, stopwords: frozenset = frozenset(), remove_numbers: bool = False, n_jobs: int = None, chunk_size: int = 10000,
+                       remove_html: bool = True) -> list:
+    """
+    Tokenize many descriptions, chunks of descriptions are tokenized in parallel worker processes
+    :param texts: iterable of descriptions
+    :param stopwords: lowercase stopwords that are removed
+    :param remove_numbers: whether tokens that only consist of digits are removed
+    :param n_jobs: number of worker processes, None to use all cores, 1 to tokenize in this process
+    :param chunk_size: number of descriptions that are sent to a worker at once
+    :param remove_html: whether html tags, entities and links are removed, see tokenize
+    :return: list with the list of tokens of every description, in the order of the descriptions
+    """
+    texts = list(texts)
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1 or len(texts) <= chunk_size:
+        return _tokenize_chunk(texts, stopwords, remove_numbers, remove_html)
+    chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+    tokenize_chunk = partial(_tokenize_chunk, stopwords=stopwords, remove_numbers=remove_numbers, remove_html=remove_html)
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return [tokens for chunk_tokens in executor.map(tokenize_chunk, chunks) for tokens in chunk_tokens]
+
+
+def pretokenized(tokens: list) -> list:
+    """
+    Analyzer for sklearn's CountVectorizer when the documents were already tokenized with tokenize_documents
+    :param tokens: list of tokens of a description
+    :return: the same list of tokens
+    """
+    return tokens
@@ -0,0 +1,161 @@
+# The LDA topic model of the step-by-step-walkthrough notebook that assigns the stimmung (flair) of an event.
+# The fitted vectorizer, the LDA model and the mapping from topic to stimmung are saved together, so new events
+# can be labeled with the same model instead of fitting it again. The model can be fitted in minibatches and
+# updated online with new descriptions, labeling many events is done in chunks in worker processes.
+
+import pickle
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from utils.tokenizer import get_topic_model_stopwords, tokenize_documents, pretokenized
+
+# NOTE: The topic number of the pyLDAvis plot does not correspond with the actual number, see the notebook.
+# The mapping only belongs to the LDA model fitted in the notebook, the topics of every other fit are numbered differently
+TOPIC_LABELS_MAPPING = {
+    0: 'Körperbewusst',
+    1: 'Musikalisch',
+    2: 'Informativ',
+    3: 'Gesellig',
+    4: 'Energetisch'
+}
+
+
+def get_event_descriptions(descriptions: pd.Series) -> list:
+    """
+    Vectorized replacement of the iterrows loop of the notebook, missing descriptions become 'Anderes'
+    :param descriptions: series of event descriptions
+    :return: list with a description for every event
+    """
+    return descriptions.where(descriptions.map(lambda description: isinstance(description, str)), 'Anderes').tolist()
+
+
+def tokenize_descriptions(descriptions: pd.Series, n_jobs: int = None) -> list:
+    """
+    :param descriptions: series of event descriptions
+    :param n_jobs: number of worker processes, None to use all cores, 1 to tokenize in this process
+    :return: list with the list of tokens of every description without the stop words of the topic model
+    """
+    # the html is kept like in the fit of the notebook, the saved vocabulary and topic_labels_mapping belong to these tokens
+    return tokenize_documents(get_event_descriptions(descriptions), get_topic_model_stopwords(), n_jobs=n_jobs, remove_html=False)
+
+
+def fit_topic_model(descriptions: pd.Series, num_topics: int = 5, topic_labels_mapping: dict = None, batch_size: int = None,
+                    random_state: int = 42, n_jobs: int = None) -> dict:
+    """
+    Fit the vectorizer and the LDA model like the notebook does. The numbers of the topics are arbitrary for every
+    fit, so the stimmung of the topics has to be chosen from their words, see get_top_words
+    :param descriptions: series of event descriptions
+    :param num_topics: number of topics
+    :param topic_labels_mapping: dictionary with the topic number as key and the stimmung as value, None if it is
+        chosen after the fit. predict_stimmung needs it
+    :param batch_size: fit the LDA model online in minibatches of this many documents, None to fit it in one batch
+    :param random_state: random state of the LDA model
+    :param n_jobs: number of worker processes used for tokenizing
+    :return: topic model as returned by load_topic_model
+    """
+    from sklearn.decomposition import LatentDirichletAllocation
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    vectorizer = CountVectorizer(analyzer=pretokenized, max_features=1000, max_df=0.85)
+    X = vectorizer.fit_transform(tokenize_descriptions(descriptions, n_jobs))
+    if batch_size is None:
+        lda = LatentDirichletAllocation(n_components=num_topics, random_state=random_state).fit(X)
+    else:
+        lda = LatentDirichletAllocation(n_components=num_topics, learning_method='online', batch_size=batch_size,
+                                        total_samples=X.shape[0], random_state=random_state)
+        for start in range(0, X.shape[0], batch_size):
+            lda.partial_fit(X[start:start + batch_size])
+    return {'vectorizer': vectorizer, 'lda': lda, 'topic_labels_mapping': topic_labels_mapping}
+
+
+def get_top_words(topic_model: dict, n_top_words: int = 20) -> dict:
+    """
+    Most probable words of every topic like print_top_words of the notebook, to choose the topic_labels_mapping
+    :param topic_model: topic model as returned by fit_topic_model
+    :param n_top_words: number of words per topic
+    :return: dictionary with the topic number as key and the list of its most probable words as value
+    """
+    feature_names = topic_model['vectorizer'].get_feature_names_out()
+    return {topic_idx: [feature_names[i] for i in topic.argsort()[:-n_top_words - 1:-1]]
+            for topic_idx, topic in enumerate(topic_model['lda'].components_)}
+
+
+def update_topic_model(topic_model: dict, description_batches) -> dict:
+    """
+    Update the LDA model online with streamed descriptions. The vocabulary of the vectorizer is not changed,
+    words that are not in the vocabulary are ignored.
+    :param topic_model: topic model loaded by load_topic_model
+    :param description_batches: iterable of series of event descriptions, e.g. the chunks of iter_json_data_chunks
+    :return: the same topic model with the updated LDA model
+    """
+    for descriptions in description_batches:
+        if len(descriptions) == 0:
+            continue
+        X = topic_model['vectorizer'].transform(tokenize_descriptions(descriptions, n_jobs=1))
+        topic_model['lda'].partial_fit(X)
+    return topic_model
+
+
+def save_topic_model(vectorizer, lda, topic_labels_mapping: dict, path: str):
+    """
+    Save the fitted topic model
+    :param vectorizer: fitted CountVectorizer with analyzer=pretokenized
+    :param lda: fitted LatentDirichletAllocation
+    :param topic_labels_mapping: dictionary with the topic number as key and the stimmung as value
+    :param path: path of the pickle file
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        pickle.dump({'vectorizer': vectorizer, 'lda': lda, 'topic_labels_mapping': topic_labels_mapping}, f)
+
+
+def load_topic_model(path: str) -> dict:
+    """
+    Load a topic model saved by save_topic_model
+    :param path: path of the pickle file
+    :return: dictionary with the keys vectorizer, lda and topic_labels_mapping
+    """
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+# topic model of a worker process, it is sent once per worker and not with every chunk
+_worker_topic_model = None
+
+
+def _init_worker(topic_model: dict):
+    global _worker_topic_model
+    _worker_topic_model = topic_model
+
+
+def _predict_chunk(descriptions: pd.Series, topic_model: dict = None) -> np.ndarray:
+    topic_model = topic_model or _worker_topic_model
+    X = topic_model['vectorizer'].transform(tokenize_descriptions(descriptions, n_jobs=1))
+    predicted_labels = topic_model['lda'].transform(X).argmax(axis=1)
+    return np.array([topic_model['topic_labels_mapping'][label] for label in predicted_labels], dtype=object)
+
+
+def predict_stimmung(topic_model: dict, descriptions: pd.Series, batch_size: int = 10000, n_jobs: int = None) -> np.ndarray:
+    """
+    Label events with the most probable topic of their description
+    :param topic_model: topic model loaded by load_topic_model
+    :param descriptions: series of event descriptions, missing descriptions are labeled like the description 'Anderes'
+    :param batch_size: number of descriptions that are labeled at once
+    :param n_jobs: number of worker processes, None to use all cores, 1 to label in this process
+    :return: array with the stimmung of every description
+    """
+    if topic_model.get('topic_labels_mapping') is None:
+        raise ValueError('The topic model has no topic_labels_mapping, choose the stimmung of the topics with get_top_words')
+    if len(descriptions) == 0:
+        return np.array([], dtype=object)
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    batches = [descriptions.iloc[start:start + batch_size] for start in range(0, len(descriptions), batch_size)]
+    if n_jobs == 1 or len(batches) == 1:
+        return np.concatenate([_predict_chunk(batch, topic_model) for batch in batches])
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(topic_model,)) as executor:
+        return np.concatenate(list(executor.map(_predict_chunk, batches)))
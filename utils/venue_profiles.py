@@ -0,0 +1,88 @@
+# Venue profiles of the event store. The preprocessing writes the number of events of every venue per
+# combination of the sidebar facets next to the event store. The location tables of the dashboards are computed
+# from these facet counts instead of the events, recurring events of a venue share one row.
+# Despite the name of the module there is no profile table per venue (names, categories or a description of the
+# venue), the facet counts are all that the dashboards and the query service need.
+
+import os
+import numpy as np
+import pandas as pd
+
+from utils.atomic_write import write_atomically
+from utils.data_preprocessing import LOCATION_COLUMNS
+from utils.filter_index import FACET_COLUMNS
+
+VENUE_COLUMN, ADDRESS_COLUMN = LOCATION_COLUMNS
+# key of the parquet metadata with the hash of the event store that the table was built from
+STORE_HASH_KEY = b'event_store_hash'
+
+
+def build_venue_facet_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Count the events of every venue and address per combination of the facets that occurs in the data
+    :param df: dataframe containing the events
+    :return: dataframe with the venue, address and facet columns, the number of events (count) and the position of
+        the first event of the combination (first_row), sorted by first_row like the events
+    """
+    positions = pd.Series(np.arange(len(df), dtype=np.int32), index=df.index)
+    keys = [df[column] for column in [VENUE_COLUMN, ADDRESS_COLUMN] + FACET_COLUMNS]
+    facet_counts = positions.groupby(keys, dropna=False, observed=True, sort=False).agg(['size', 'min']).reset_index()
+    facet_counts = facet_counts.rename(columns={'size': 'count', 'min': 'first_row'})
+    facet_counts['count'] = facet_counts['count'].astype(np.int32)
+    facet_counts['first_row'] = facet_counts['first_row'].astype(np.int32)
+    return facet_counts.sort_values('first_row', ignore_index=True)
+
+
+def get_venue_table_path(store_path: str, name: str) -> str:
+    """
+    :param store_path: path of the event store
+    :param name: name of the table, e.g. venue_counts
+    :return: path of the table next to the event store, e.g. data/all_events_dashboard.venue_counts.parquet
+    """
+    return f'{os.path.splitext(store_path)[0]}.{name}.parquet'
+
+
+def _write_table(df: pd.DataFrame, path: str, store_hash: str):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), STORE_HASH_KEY: store_hash.encode()})
+    write_atomically(path, lambda tmp_path: pq.write_table(table, tmp_path))
+
+
+def save_venue_facet_counts(df: pd.DataFrame, store_path: str, store_hash: str):
+    """
+    Write the facet counts of the venues next to the event store
+    :param df: dataframe containing the events in the order of the event store
+    :param store_path: path of the event store that was written from df
+    :param store_hash: sha256 hash of the event store file, see compute_file_hash
+    """
+    _write_table(build_venue_facet_counts(df), get_venue_table_path(store_path, 'venue_counts'), store_hash)
+
+
+def load_venue_table(store_path: str, name: str, store_hash: str) -> pd.DataFrame:
+    """
+    :param store_path: path of the event store
+    :param name: name of the table, e.g. venue_counts
+    :param store_hash: sha256 hash of the current event store file
+    :return: the table, None if it does not exist or was built from another version of the event store
+    """
+    import pyarrow.parquet as pq
+    path = get_venue_table_path(store_path, name)
+    if not os.path.exists(path):
+        return None
+    if (pq.read_schema(path).metadata or {}).get(STORE_HASH_KEY) != store_hash.encode():
+        return None
+    return pd.read_parquet(path)
+
+
+def get_venue_facet_counts(store_path: str, df: pd.DataFrame, store_hash: str) -> pd.DataFrame:
+    """
+    Load the facet counts that the preprocessing wrote, or build them if they are missing or outdated
+    :param store_path: path of the event store
+    :param df: dataframe containing the events of the event store
+    :param store_hash: sha256 hash of the event store file
+    :return: dataframe created by build_venue_facet_counts
+    """
+    facet_counts = load_venue_table(store_path, 'venue_counts', store_hash)
+    return facet_counts if facet_counts is not None else build_venue_facet_counts(df)
@@ -0,0 +1,146 @@
+# Word frequencies of the event descriptions for the word cloud of the dashboards.
+# The descriptions are tokenized once per dataset version with utils/tokenizer and stored as compact per-row
+# token counts, the rendered word cloud is cached as png next to the dataset. This is done offline by the
+# preprocessing pipeline, the incremental ingest or the command below, the dashboards only read the png.
+# Stopwords are bundled with the repository, so nothing has to be downloaded.
+#
+# Usage: python -m utils.word_frequencies data/2000_events_sample.csv data/all_events_dashboard.parquet
+
+import argparse
+import io
+import os
+from itertools import chain
+import numpy as np
+import pandas as pd
+
+from utils.atomic_write import write_atomically
+from utils.tokenizer import get_word_cloud_stopwords, tokenize_documents
+
+# part of the cache file names, increase it when the tokenization changes so old caches are not used anymore
+CACHE_VERSION = 2
+
+
+def compute_token_counts(descriptions: pd.Series, n_jobs: int = None) -> dict:
+    """
+    Count the tokens of every description. The counts are stored like a sparse matrix in compressed row format:
+    the token ids and counts of row i are token_ids[row_offsets[i]:row_offsets[i + 1]].
+    :param descriptions: series of event descriptions, missing descriptions have no tokens
+    :param n_jobs: number of worker processes used for tokenizing, None to use all cores
+    :return: dictionary with the arrays vocabulary, row_offsets, token_ids and counts
+    """
+    token_lists = tokenize_documents(descriptions, get_word_cloud_stopwords(), remove_numbers=True, n_jobs=n_jobs)
+    num_tokens = np.array([len(tokens) for tokens in token_lists], dtype=np.int64)
+    token_ids, vocabulary = pd.factorize(pd.Series(list(chain.from_iterable(token_lists)), dtype=object))
+    row_ids = np.repeat(np.arange(len(token_lists), dtype=np.int64), num_tokens)
+    # count every (row, token) pair once
+    pairs, counts = np.unique(row_ids * max(len(vocabulary), 1) + token_ids, return_counts=True)
+    pair_rows = pairs // max(len(vocabulary), 1)
+    return {
+        'vocabulary': np.asarray(vocabulary, dtype=str),
+        'row_offsets': np.searchsorted(pair_rows, np.arange(len(token_lists) + 1)).astype(np.int64),
+        'token_ids': (pairs % max(len(vocabulary), 1)).astype(np.int32),
+        'counts': np.minimum(counts, np.iinfo(np.uint16).max).astype(np.uint16),
+    }
+
+
+def save_token_counts(token_counts: dict, path: str):
+    write_atomically(path, lambda tmp_path: np.savez_compressed(tmp_path, **token_counts))
+
+
+def load_token_counts(path: str) -> dict:
+    with np.load(path) as token_counts:
+        return {name: token_counts[name] for name in token_counts.files}
+
+
+def get_word_frequencies(token_counts: dict, rows: np.ndarray = None, max_words: int = 200) -> dict:
+    """
+    Sum the token counts of a subset of the rows without tokenizing the descriptions again
+    :param token_counts: token counts created by compute_token_counts
+    :param rows: positions of the rows that should be counted, None to count all rows
+    :param max_words: number of most frequent words that are returned
+    :return: dictionary with the most frequent words as keys and their counts as values
+    """
+    token_ids, counts = token_counts['token_ids'], token_counts['counts']
+    if rows is not None:
+        row_offsets = token_counts['row_offsets']
+        num_entries = np.diff(row_offsets)
+        entry_rows = np.repeat(np.arange(len(num_entries)), num_entries)
+        selected = np.zeros(len(num_entries), dtype=bool)
+        selected[rows] = True
+        entry_selected = selected[entry_rows]
+        token_ids, counts = token_ids[entry_selected], counts[entry_selected]
+    totals = np.bincount(token_ids, weights=counts, minlength=len(token_counts['vocabulary']))
+    most_frequent = np.argsort(-totals, kind='stable')[:max_words]
+    return {str(token_counts['vocabulary'][i]): int(totals[i]) for i in most_frequent if totals[i] > 0}
+
+
+def render_word_cloud(frequencies: dict) -> bytes:
+    """
+    Render a word cloud of the word frequencies
+    :param frequencies: dictionary with words as keys and their counts as values
+    :return: png image of the word cloud
+    """
+    from wordcloud import WordCloud
+    word_cloud = WordCloud(width=800, height=400, background_color='white').generate_from_frequencies(frequencies)
+    png = io.BytesIO()
+    word_cloud.to_image().save(png, format='png')
+    return png.getvalue()
+
+
+def _write_bytes(path: str, content: bytes):
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def get_word_cloud_cache_paths(data_path: str, dataset_hash: str) -> tuple:
+    """
+    :param data_path: path of the dataset
+    :param dataset_hash: hash of the dataset file
+    :return: paths of the cached token counts and the cached word cloud png of this dataset version
+    """
+    cache_dir = os.path.join(os.path.dirname(data_path), 'cache')
+    prefix = os.path.join(cache_dir, f'{os.path.splitext(os.path.basename(data_path))[0]}-{dataset_hash[:16]}-v{CACHE_VERSION}')
+    return f'{prefix}.token_counts.npz', f'{prefix}.word_cloud.png'
+
+
+def build_word_cloud_cache(data_path: str, dataset_hash: str, descriptions: pd.Series, n_jobs: int = None) -> str:
+    """
+    Compute the token counts of all descriptions of a dataset version and render its word cloud into the cache
+    :param data_path: path of the dataset
+    :param dataset_hash: hash of the dataset file, see compute_file_hash
+    :param descriptions: series of all event descriptions of the dataset
+    :param n_jobs: number of worker processes used for tokenizing, None to use all cores
+    :return: path of the cached word cloud png
+    """
+    token_counts_path, png_path = get_word_cloud_cache_paths(data_path, dataset_hash)
+    os.makedirs(os.path.dirname(png_path), exist_ok=True)
+    token_counts = compute_token_counts(descriptions, n_jobs=n_jobs)
+    save_token_counts(token_counts, token_counts_path)
+    png = render_word_cloud(get_word_frequencies(token_counts))
+    write_atomically(png_path, lambda tmp_path: _write_bytes(tmp_path, png))
+    return png_path
+
+
+def load_word_cloud_png(data_path: str, dataset_hash: str) -> bytes:
+    """
+    :param data_path: path of the dataset
+    :param dataset_hash: hash of the dataset file
+    :return: the cached word cloud png of this dataset version, None if it was not built yet
+    """
+    png_path = get_word_cloud_cache_paths(data_path, dataset_hash)[1]
+    if not os.path.exists(png_path):
+        return None
+    with open(png_path, 'rb') as f:
+        return f.read()
+
+
+if __name__ == "__main__":
+    from utils.data_preprocessing import load_event_store
+    from utils.dataset_loader import compute_file_hash
+    parser = argparse.ArgumentParser(description='Build the cached word clouds of the event datasets for the dashboards')
+    parser.add_argument('data_files', nargs='+', help='csv or parquet event stores, e.g. data/2000_events_sample.csv')
+    parser.add_argument('--jobs', type=int, default=None, help='number of processes used for tokenizing, default is all cores')
+    args = parser.parse_args()
+    for data_file in args.data_files:
+        png_path = build_word_cloud_cache(data_file, compute_file_hash(data_file), load_event_store(data_file, columns=['description'])['description'], n_jobs=args.jobs)
+        print(f'{data_file} -> {png_path}')